@@ -19,5 +19,7 @@ class QueryGraphNodes(
     Inherits from specialized modular classes to maintain a clean monolithic interface
     internally while being modular in structure.
     """
+    __slots__ = ()
+
     def __init__(self, agent_config=None):
         super().__init__(agent_config=agent_config)
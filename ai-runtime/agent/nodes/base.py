@@ -1,15 +1,28 @@
+import os
+import sys
 import time
+import asyncio
 import re
-import copy
-from datetime import datetime
-from typing import Dict, Any, List, Optional, Tuple, Set, TypedDict, Annotated
+import logging
+import json
+import hashlib
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple, Set, TypedDict, Annotated
 import operator
+from collections import defaultdict
+from functools import lru_cache
 import structlog
-import sqlparse
-from sqlparse.sql import Identifier, IdentifierList
-from sqlparse.tokens import Keyword
+import sqlglot
+from sqlglot import exp
 from langchain_core.messages import SystemMessage, HumanMessage
 
+# orjson is optional: fall back to stdlib json for schema hashing if not installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 from services.system_db import SystemDBService
 from services.embedding_service import EmbeddingService
 from mcp_tools.sql_validator import SQLValidator
@@ -19,8 +32,158 @@ from services.audit_service import audit_service
 from agent.llm import get_llm
 from agent.utils import parse_json_content, format_chat_history, make_json_serializable
 from services.embedding_cache import embedding_cache
+from services.llm_response_cache import llm_response_cache
 
 logger = structlog.get_logger()
+# Stdlib twin of the structlog logger, used to gate per-row/per-column debug
+# logs so their event dicts are never built when DEBUG is filtered out.
+_stdlib_logger = logging.getLogger(__name__)
+
+_EMPTY_SET: frozenset = frozenset()
+
+# Shared cap on in-flight LLM requests for batch callers
+_LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "10")))
+
+# Memoized, interned str.lower(). Table/column names recur endlessly across the
+# schema, SQL references and result keys, and the name universe is small, so
+# the cache stays bounded by the number of distinct identifiers.
+_lower_cache: Dict[str, str] = {}
+
+def _lc(s: str) -> str:
+    r = _lower_cache.get(s)
+    if r is None:
+        r = _lower_cache.setdefault(s, sys.intern(s.lower()))
+    return r
+
+# Fast-path table scanner: captures the identifier after FROM/JOIN plus any
+# comma-separated continuation ("FROM a x, b y"). Comments are stripped first.
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+# Single pattern matching comments (with surrounding whitespace) and whitespace
+# runs, for one-pass normalization
+_NORM_RE = re.compile(r'\s*(?:--[^\n]*|/\*.*?\*/)\s*|\s+', re.DOTALL)
+_TABLE_RE = re.compile(r'\b(?:from|join)\s+([`"\[\]\w.]+)', re.IGNORECASE)
+# Wall-clock timestamps interpolated into turn contexts ("Current Date:
+# 2024-01-01 12:34:56"). Stripped to the date part when building response
+# cache keys, which would otherwise be unique per second and never hit.
+_PROMPT_TIMESTAMP_RE = re.compile(r'\b(\d{4}-\d{2}-\d{2}) \d{2}:\d{2}:\d{2}\b')
+_FROM_LIST_RE = re.compile(r'\s*(?:as\s+)?\w*\s*,\s*([`"\[\]\w.]+)', re.IGNORECASE)
+_QUOTE_TRANS = str.maketrans('', '', '`"[]')
+_WORD_RE = re.compile(r'\w+')
+
+
+def _json_for_prompt(obj: Any) -> str:
+    """Compact JSON for embedding small structures in LLM prompts.
+
+    No indentation: pretty-printing these values costs extra prompt tokens
+    (and serialization CPU) without improving model comprehension.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, separators=(',', ':'), default=str)
+
+@lru_cache(maxsize=4096)
+def _normalize_sql_cached(sql: str) -> str:
+    """One-pass SQL normalization, memoized — the same statement is normalized
+    repeatedly across the validator, corrector and audit paths."""
+    s = _NORM_RE.sub(' ', sql.lower())
+    return s.strip().rstrip(';').strip()
+
+@lru_cache(maxsize=4096)
+def _fast_extract_tables_cached(sql: str) -> Tuple[str, ...]:
+    """Memoized compiled-regex table scan (see BaseNode._fast_extract_tables)."""
+    sql = _COMMENT_RE.sub(' ', sql)
+    tables = []
+    for m in _TABLE_RE.finditer(sql):
+        tables.append(m.group(1).translate(_QUOTE_TRANS).split('.')[-1])
+        tail = sql[m.end():]
+        cm = _FROM_LIST_RE.match(tail)
+        while cm:
+            tables.append(cm.group(1).translate(_QUOTE_TRANS).split('.')[-1])
+            tail = tail[cm.end():]
+            cm = _FROM_LIST_RE.match(tail)
+    return tuple(dict.fromkeys(tables))
+
+# Per-response-class token usage extractors, resolved once by introspection
+_TOKEN_EXTRACTORS: Dict[type, Any] = {}
+
+def _extract_token_usage(raw_response: Any) -> Dict[str, Any]:
+    """
+    Normalize provider token usage. The hasattr introspection runs once per
+    response class; subsequent calls are a dict lookup plus one closure call.
+    """
+    extractor = _TOKEN_EXTRACTORS.get(type(raw_response))
+    if extractor is None:
+        has_usage_meta = hasattr(raw_response, 'usage_metadata')
+        has_response_meta = hasattr(raw_response, 'response_metadata')
+
+        def extractor(r, _um=has_usage_meta, _rm=has_response_meta):
+            if _um and r.usage_metadata:
+                usage = r.usage_metadata
+                out = {
+                    "prompt_tokens": usage.get("input_tokens", usage.get("prompt_tokens")),
+                    "completion_tokens": usage.get("output_tokens", usage.get("completion_tokens")),
+                    "total_tokens": usage.get("total_tokens")
+                }
+                # Provider prompt-cache telemetry (Anthropic cache_control /
+                # OpenAI automatic prefix caching), when the provider reports it
+                details = usage.get("input_token_details")
+                if details:
+                    out["cache_read_input_tokens"] = details.get("cache_read")
+                    out["cache_creation_input_tokens"] = details.get("cache_creation")
+                return out
+            if _rm:
+                meta = r.response_metadata
+                usage = meta.get("token_usage") or meta.get("usage") or {}
+                return {
+                    "prompt_tokens": usage.get("prompt_tokens"),
+                    "completion_tokens": usage.get("completion_tokens"),
+                    "total_tokens": usage.get("total_tokens")
+                }
+            return {}
+
+        _TOKEN_EXTRACTORS[type(raw_response)] = extractor
+    return extractor(raw_response)
+
+def reset_caches():
+    """Clear the module-level SQL helper caches (call on agent reload)."""
+    _normalize_sql_cached.cache_clear()
+    _fast_extract_tables_cached.cache_clear()
+
+# Generic columns (id, timestamps, tenancy keys) that appear in most tables
+COMMON_COLUMN_NAMES: frozenset = frozenset({
+    'id', 'created_at', 'updated_at', 'created_by', 'updated_by',
+    'is_deleted', 'deleted_at', 'is_active', 'status', 'name',
+    'description', 'type', 'timestamp', 'date', 'time',
+    'user_id', 'organization_id', 'tenant_id', 'owner_id'
+})
+
+def _is_common_column(col_name: str, _common=COMMON_COLUMN_NAMES) -> bool:
+    n = _lc(col_name)
+    return n in _common or n.endswith('_id')
+
+class _ColMeta(NamedTuple):
+    """Compact, pre-lowercased view of a schema column for hot validation paths."""
+    name: str
+    name_lower: str
+    queryable: bool
+    sensitive: bool
+    masking_strategy: str
+
+class _TableMeta(NamedTuple):
+    """Compact, pre-lowercased view of a schema table for hot validation paths."""
+    name: str
+    name_lower: str
+    queryable: bool
+    columns: Tuple[_ColMeta, ...]
+
+def _extend(a: List[Dict[str, str]], b: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    In-place list reducer for accumulated warning channels. operator.add copies
+    the whole accumulated list on every node return; extending mutates instead.
+    Safe because LangGraph applies reducers serially per state transition.
+    """
+    a.extend(b)
+    return a
 
 class QueryState(TypedDict):
     agent_id: str
@@ -67,12 +230,13 @@ class QueryState(TypedDict):
     no_match: bool
     new_entities: Optional[List[str]]
     canonical_query: Optional[Dict[str, Any]]
+    plan_cache_key: Optional[str]  # Builder plan-cache key, for eviction on execution failure
     generated_sql: Optional[str]
     sql_dialect: str
     validation_result: Optional[Dict[str, Any]]
     validation_success: bool
-    pre_query_warnings: Annotated[List[Dict[str, str]], operator.add]
-    queryability_warnings: Annotated[List[Dict[str, str]], operator.add]
+    pre_query_warnings: Annotated[List[Dict[str, str]], _extend]
+    queryability_warnings: Annotated[List[Dict[str, str]], _extend]
     raw_results: List[Dict[str, Any]]
     sanitized_results: List[Dict[str, Any]]
     final_response: str
@@ -85,12 +249,19 @@ class QueryState(TypedDict):
     current_step: str
 
 class BaseNode:
-    COMMON_COLUMN_NAMES = {
-        'id', 'created_at', 'updated_at', 'created_by', 'updated_by',
-        'is_deleted', 'deleted_at', 'is_active', 'status', 'name',
-        'description', 'type', 'timestamp', 'date', 'time',
-        'user_id', 'organization_id', 'tenant_id', 'owner_id'
-    }
+    # Slots (no per-instance __dict__): any new instance attribute must be added here.
+    __slots__ = (
+        'system_db', 'embedding_service', 'sql_validator', 'sensitivity_registry',
+        'dialect_translator', 'audit_logger', 'agent_config', 'llm',
+        '_schema_index_cache', '_schema_version_cache', '_normalized_schema_cache',
+        '_warning_cache', '_sql_ast_cache', '_relationship_index_cache',
+        '_fk_map_cache', '_queryability_checker_cache', '_query_tables_cache',
+        '_prompt_hint_index_cache', '_sensitivity_index_cache',
+        '_chat_history_cache', '_unique_rels_cache', '_mapping_schema_cache',
+        '_restricted_context_cache',
+    )
+
+    COMMON_COLUMN_NAMES = COMMON_COLUMN_NAMES
 
     def __init__(self, agent_config: Optional[Dict[str, Any]] = None):
         self.system_db = SystemDBService()
@@ -100,6 +271,37 @@ class BaseNode:
         self.dialect_translator = DialectTranslator()
         self.audit_logger = audit_service
         self.agent_config = agent_config
+        # Schema indexes (non-queryable/sensitive lookups) memoized per schema object
+        self._schema_index_cache: Dict[int, Tuple[Dict[str, set], List[Dict[str, Any]], set, Optional[re.Pattern]]] = {}
+        self._schema_version_cache: Dict[int, str] = {}
+        self._normalized_schema_cache: Dict[int, Tuple[_TableMeta, ...]] = {}
+        # Queryability warnings memoized by (normalized sql, schema version, forbidden fields)
+        self._warning_cache: Dict[Tuple, List[Dict[str, str]]] = {}
+        # Parsed sqlglot ASTs memoized per SQL text
+        self._sql_ast_cache: Dict[str, Any] = {}
+        # Table-name map + FK adjacency memoized per schema_metadata object
+        self._relationship_index_cache: Dict[int, Tuple[Dict[str, Dict], Dict[str, Tuple[str, ...]]]] = {}
+        # "table.col" -> "target.col" FK map memoized per relationships list
+        self._fk_map_cache: Dict[int, Dict[str, str]] = {}
+        # Specialized warning checker memoized per (schema, sensitivity_rules) pair
+        self._queryability_checker_cache: Dict[Tuple[int, int], Any] = {}
+        # Table names memoized per canonical_query object
+        # (identity-checked: per-turn objects may reuse a freed address)
+        self._query_tables_cache: Dict[int, Tuple[Dict, frozenset]] = {}
+        # (match token, rendered hint line) pairs memoized per schema object
+        self._prompt_hint_index_cache: Dict[int, Tuple[Tuple[str, str], ...]] = {}
+        # Partitioned forbiddenFields memoized per sensitivity_rules object
+        self._sensitivity_index_cache: Dict[int, Tuple] = {}
+        # Formatted chat history memoized per context list object
+        # (identity-checked: per-turn objects may reuse a freed address)
+        self._chat_history_cache: Dict[int, Tuple[List, str]] = {}
+        # Symmetrically deduped relationship pairs memoized per schema object
+        self._unique_rels_cache: Dict[int, Tuple[Tuple[str, str], ...]] = {}
+        # sqlglot MappingSchema memoized per (relevant_schema, rules) pair
+        # (identity-checked: per-turn objects may reuse a freed address)
+        self._mapping_schema_cache: Dict[Tuple[int, int], Tuple[Any, Any, Any]] = {}
+        # Unfiltered restricted-entities render memoized per (schema, rules) pair
+        self._restricted_context_cache: Dict[Tuple[int, int], str] = {}
         self.llm = None
         if agent_config:
             self.llm = get_llm(
@@ -109,18 +311,71 @@ class BaseNode:
             )
 
     def _normalize_sql(self, sql: str) -> str:
-        """Normalize SQL for comparison by removing comments, extra whitespace, and trailing semicolons."""
+        """
+        Normalize SQL for comparison by removing comments, extra whitespace, and
+        trailing semicolons. Pure and memoized at module level.
+        """
         if not sql:
             return ""
-        # Remove comments
-        sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
-        sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
-        # Normalize whitespace and lowercase
-        sql = sql.replace('\n', ' ').strip().lower()
-        sql = re.sub(r'\s+', ' ', sql)
-        # Remove trailing semicolon
-        sql = sql.rstrip(';')
-        return sql
+        return _normalize_sql_cached(sql)
+
+    def _format_chat_history(self, history: List[Dict[str, Any]]) -> str:
+        """
+        format_chat_history memoized per context list object: intent and
+        builder both render the same per-turn history, so the second call
+        reuses the string byte-for-byte (which also keeps the prompt text
+        stable for provider-side caching). The window itself is already
+        capped upstream where the thread history is fetched.
+        """
+        if not history:
+            return "No previous context."
+        cached = self._chat_history_cache.get(id(history))
+        # The instance outlives the turn (the compiled pipeline binds one nodes
+        # instance per agent), and CPython reuses freed addresses — so verify
+        # identity, and hold the list so its id can't be recycled while cached.
+        if cached is not None and cached[0] is history:
+            return cached[1]
+        formatted = format_chat_history(history)
+        self._chat_history_cache = {id(history): (history, formatted)}  # Keep only latest
+        return formatted
+
+    def _get_unique_relationships(self, schema_metadata: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        """
+        Relationship (source, target) pairs with symmetrical duplicates removed
+        ((A, B) and (B, A) count as one), first-seen order preserved. Memoized
+        per schema object so the per-pair sorting runs once per schema load.
+        """
+        pairs = self._unique_rels_cache.get(id(schema_metadata))
+        if pairs is None:
+            seen = set()
+            unique = []
+            for rel in schema_metadata.get("relationships", []):
+                src = rel.get("sourceTable")
+                tgt = rel.get("targetTable")
+                if src and tgt:
+                    key = (src, tgt) if src <= tgt else (tgt, src)
+                    if key not in seen:
+                        seen.add(key)
+                        unique.append((src, tgt))
+            pairs = tuple(unique)
+            self._unique_rels_cache = {id(schema_metadata): pairs}  # Keep only latest
+        return pairs
+
+    def _static_system_message(self, text: str) -> SystemMessage:
+        """
+        System message for the agent-invariant prompt prefix. On Anthropic the
+        block is marked cache_control: ephemeral so the provider reuses the
+        prefill KV across turns; OpenAI/OpenRouter prefix caching is automatic,
+        so other providers get a plain string message.
+        """
+        provider = self.agent_config.get('llmProvider') if self.agent_config else None
+        if provider == 'anthropic':
+            return SystemMessage(content=[{
+                "type": "text",
+                "text": text,
+                "cache_control": {"type": "ephemeral"}
+            }])
+        return SystemMessage(content=text)
 
     async def _call_llm_with_logging(
         self, 
@@ -134,7 +389,66 @@ class BaseNode:
             raise ValueError("LLM not initialized. Call load_config node first.")
 
         start_time = time.time()
-        
+
+        provider = self.agent_config.get('llmProvider', 'openai') if self.agent_config else 'openai'
+        model = self.agent_config.get('llmModel', 'unknown') if self.agent_config else 'unknown'
+        temperature = self.agent_config.get('llmTemperature', 0.0) if self.agent_config else 0.0
+
+        # Response cache: only for deterministic calls (temperature 0). Tier 1 is an
+        # exact hash of the full request; tier 2 reuses a near-identical prompt from
+        # the same node/model bucket via embedding similarity.
+        cache_key = None
+        cache_bucket = None
+        prompt_embedding = None
+        if not temperature:
+            structured_name = structured_model.__name__ if structured_model else ""
+            message_contents = [str(m.content) for m in messages]
+            # Key on the date, not the second: the turn context interpolates a
+            # full timestamp, which would make every exact key unique
+            key_contents = [_PROMPT_TIMESTAMP_RE.sub(r'\1', c) for c in message_contents]
+            agent_id = self.agent_config.get('id', '') if self.agent_config else ''
+            cache_key = llm_response_cache.make_key(node_name, provider, model, structured_name, key_contents)
+            cache_bucket = llm_response_cache.make_bucket(agent_id, node_name, model, structured_name)
+            entry = llm_response_cache.get(cache_key)
+            if entry is None:
+                # Similarity tier compares the per-turn content: everything
+                # after the static first system message. Embedding the shared
+                # prefix would let it dominate the vector; embedding the user
+                # message alone would drop the turn context (chat history,
+                # previous SQL, intent analysis), and the same short message
+                # ("remove that filter") means different things in different
+                # conversations. key_contents is reused so the embedded text
+                # is timestamp-free and the embedding itself caches.
+                if isinstance(messages[0], SystemMessage) and len(messages) > 1:
+                    user_text = "\n".join(key_contents[1:])
+                else:
+                    user_text = "\n".join(key_contents)
+                if user_text:
+                    try:
+                        prompt_embedding = await self.embedding_service.generate_single_embedding(user_text)
+                    except Exception as e:
+                        logger.debug("Prompt embedding for LLM cache failed", error=str(e))
+                        prompt_embedding = None
+                if prompt_embedding:
+                    entry = llm_response_cache.get_similar(cache_bucket, prompt_embedding)
+            if entry is not None:
+                duration_ms = int((time.time() - start_time) * 1000)
+                cached_obj = entry["response"]
+                if query_history_id:
+                    self.audit_logger.log_llm_call_nowait(
+                        query_history_id=query_history_id,
+                        node_name=node_name,
+                        llm_provider=provider,
+                        llm_model=model,
+                        prompt="\n".join(message_contents),
+                        response=cached_obj.model_dump_json() if hasattr(cached_obj, "model_dump_json") else str(cached_obj),
+                        llm_config={"cached": True},
+                        token_usage=entry.get("token_usage"),
+                        duration_ms=duration_ms
+                    )
+                logger.info(f"LLM cache hit for {node_name}", duration_ms=duration_ms)
+                return cached_obj
+
         try:
             if structured_model:
                 # Use with_structured_output for guaranteed schema compliance
@@ -150,7 +464,9 @@ class BaseNode:
                                  node_name=node_name, 
                                  raw_content=raw_response.content if hasattr(raw_response, 'content') else str(raw_response))
                 
-                content = response_obj.model_dump() if response_obj and hasattr(response_obj, "model_dump") else str(response_obj)
+                # model_dump_json serializes straight to a string, skipping the
+                # intermediate dict that model_dump builds just for logging
+                content = response_obj.model_dump_json() if response_obj and hasattr(response_obj, "model_dump_json") else str(response_obj)
             else:
                 raw_response = await self.llm.ainvoke(messages)
                 response_obj = raw_response
@@ -158,37 +474,21 @@ class BaseNode:
 
             duration_ms = int((time.time() - start_time) * 1000)
             
-            # Extract token usage from raw response
-            token_usage = {}
-            if hasattr(raw_response, 'usage_metadata') and raw_response.usage_metadata:
-                usage = raw_response.usage_metadata
-                token_usage = {
-                    "prompt_tokens": usage.get("input_tokens", usage.get("prompt_tokens")),
-                    "completion_tokens": usage.get("output_tokens", usage.get("completion_tokens")),
-                    "total_tokens": usage.get("total_tokens")
-                }
-            elif hasattr(raw_response, 'response_metadata'):
-                meta = raw_response.response_metadata
-                usage = meta.get("token_usage") or meta.get("usage") or {}
-                token_usage = {
-                    "prompt_tokens": usage.get("prompt_tokens"),
-                    "completion_tokens": usage.get("completion_tokens"),
-                    "total_tokens": usage.get("total_tokens")
-                }
+            # Extract token usage from raw response (per-class cached extractor)
+            token_usage = _extract_token_usage(raw_response)
 
             # Log to audit service
             if query_history_id:
-                system_prompt = ""
-                user_prompts = []
+                # Split once into system/user parts and join — avoids the quadratic
+                # string growth of appending to system_prompt per message
+                sys_parts, user_parts = [], []
                 for m in messages:
-                    if isinstance(m, SystemMessage):
-                        system_prompt += str(m.content) + "\n"
-                    else:
-                        user_prompts.append(str(m.content))
-                
-                prompt_text = "\n".join(user_prompts)
-                
-                await self.audit_logger.log_llm_call(
+                    content = m.content if isinstance(m.content, str) else str(m.content)
+                    (sys_parts if isinstance(m, SystemMessage) else user_parts).append(content)
+                system_prompt = "\n".join(sys_parts)
+                prompt_text = "\n".join(user_parts)
+
+                self.audit_logger.log_llm_call_nowait(
                     query_history_id=query_history_id,
                     node_name=node_name,
                     llm_provider=self.agent_config.get('llmProvider', 'openai') if self.agent_config else 'openai',
@@ -205,116 +505,388 @@ class BaseNode:
                 duration_ms=duration_ms,
                 tokens=token_usage.get('total_tokens', 0)
             )
-            
+
+            if cache_key and response_obj is not None:
+                llm_response_cache.put(cache_key, cache_bucket, response_obj, token_usage, prompt_embedding)
+
             return response_obj
         except Exception as e:
             logger.error(f"LLM call failed for {node_name}", error=str(e))
             raise
 
+    def _normalize_schema(self, schema: Dict[str, Any]) -> Tuple[_TableMeta, ...]:
+        """
+        Convert the raw schema dict into an immutable tuple of _TableMeta records
+        with names lowercased and queryable/sensitive flags resolved up front.
+        Hot paths iterate this compact form instead of repeating dict.get fallbacks
+        and str.lower calls per validation. Memoized per schema object.
+        """
+        cached = self._normalized_schema_cache.get(id(schema))
+        if cached is not None:
+            return cached
+
+        tables = []
+        for table in schema.get("tables", []):
+            t_name = table.get('name') or table.get('tableName', '')
+            cols = tuple(
+                _ColMeta(
+                    name=col.get('name') or col.get('columnName', ''),
+                    name_lower=_lc(col.get('name') or col.get('columnName', '')),
+                    queryable=col.get("isQueryable", True),
+                    sensitive=col.get("isSensitive", False),
+                    masking_strategy=col.get("maskingStrategy", "full"),
+                )
+                for col in table.get("columns", [])
+            )
+            tables.append(_TableMeta(
+                name=t_name,
+                name_lower=_lc(t_name),
+                queryable=table.get("isQueryable", True),
+                columns=cols,
+            ))
+
+        normalized = tuple(tables)
+        self._normalized_schema_cache = {id(schema): normalized}  # Keep only latest schema
+        return normalized
+
+    def _get_schema_index(self, schema: Dict[str, Any]) -> Tuple[Dict[str, set], List[Dict[str, Any]], set, Optional[re.Pattern]]:
+        """
+        Build (and memoize) fast lookup indexes for a schema:
+        - non_queryable_by_table: lowercase table name -> set of lowercase non-queryable column names
+        - sensitive_cols: precomputed list for the sensitivity registry
+        - non_queryable_tables: set of lowercase fully non-queryable table names
+        - non_queryable_table_regex: single compiled alternation matching any restricted table name
+        Computed once per schema object instead of re-scanning tables x columns per validation.
+        """
+        cached = self._schema_index_cache.get(id(schema))
+        if cached is not None:
+            return cached
+
+        non_queryable_by_table: Dict[str, set] = {}
+        non_queryable_tables: set = set()
+        sensitive_cols: List[Dict[str, Any]] = []
+
+        for table in self._normalize_schema(schema):
+            if not table.queryable:
+                non_queryable_tables.add(table.name_lower)
+            cols = set()
+            for col in table.columns:
+                if col.sensitive:
+                    sensitive_cols.append({"table": table.name, "column": col.name, "maskingStrategy": col.masking_strategy})
+                if not col.queryable:
+                    cols.add(col.name_lower)
+                    sensitive_cols.append({"table": table.name, "column": col.name, "maskingStrategy": "remove"})
+            if cols:
+                non_queryable_by_table[table.name_lower] = cols
+
+        # One compiled alternation lets the fallback path find every restricted
+        # table in a single scan of the SQL instead of one scan per table.
+        non_queryable_table_regex = None
+        if non_queryable_tables:
+            non_queryable_table_regex = re.compile(
+                r'\b(' + '|'.join(map(re.escape, sorted(non_queryable_tables))) + r')\b',
+                re.IGNORECASE
+            )
+
+        index = (non_queryable_by_table, sensitive_cols, non_queryable_tables, non_queryable_table_regex)
+        self._schema_index_cache = {id(schema): index}  # Keep only latest schema to avoid unbounded growth
+        return index
+
+    async def _call_llm_with_logging_many(
+        self,
+        messages_batches: List[List[Any]],
+        node_name: str,
+        query_history_id: Optional[str] = None,
+        structured_model: Optional[Any] = None
+    ) -> List[Any]:
+        """
+        Issue several LLM calls concurrently instead of serially, bounded by
+        LLM_MAX_CONCURRENCY. Each item keeps the per-call audit logging and
+        response caching of _call_llm_with_logging; failures come back as
+        exception objects in the result list rather than aborting the batch.
+        """
+        if not messages_batches:
+            return []
+
+        async def _one(messages: List[Any]) -> Any:
+            async with _LLM_SEMAPHORE:
+                return await self._call_llm_with_logging(
+                    messages, node_name, query_history_id, structured_model
+                )
+
+        return await asyncio.gather(
+            *(_one(messages) for messages in messages_batches),
+            return_exceptions=True
+        )
+
+    def _get_relationship_index(self, schema_metadata: Dict[str, Any]) -> Tuple[Dict[str, Dict], Dict[str, Tuple[str, ...]]]:
+        """
+        Build (and memoize) per-schema lookup structures for context assembly:
+        - tables_by_lower_name: lowercase table name -> table dict
+        - fk_adjacency: lowercase table name -> directly related table names
+        Replaces the O(tables) and O(relationships) scans previously done on
+        every node invocation.
+        """
+        cached = self._relationship_index_cache.get(id(schema_metadata))
+        if cached is not None:
+            return cached
+
+        tables_by_lower_name = {
+            _lc(t.get("name") or t.get("tableName", "")): t
+            for t in schema_metadata.get("tables", [])
+        }
+        adjacency_sets: Dict[str, set] = {}
+        for rel in schema_metadata.get("relationships", []):
+            src = _lc(rel.get("sourceTable", ""))
+            tgt = _lc(rel.get("targetTable", ""))
+            if src and tgt:
+                adjacency_sets.setdefault(src, set()).add(tgt)
+                adjacency_sets.setdefault(tgt, set()).add(src)
+        # Freeze to tuples: deduped, compact, and safe to hand out
+        fk_adjacency = {name: tuple(neighbors) for name, neighbors in adjacency_sets.items()}
+
+        index = (tables_by_lower_name, fk_adjacency)
+        self._relationship_index_cache = {id(schema_metadata): index}  # Keep only latest schema
+        return index
+
+    def _schema_version(self, schema: Dict[str, Any]) -> str:
+        """Stable content hash of the schema, memoized per schema object."""
+        version = self._schema_version_cache.get(id(schema))
+        if version is None:
+            if ORJSON_AVAILABLE:
+                payload = orjson.dumps(schema, option=orjson.OPT_SORT_KEYS, default=str)
+            else:
+                payload = json.dumps(schema, sort_keys=True, default=str).encode()
+            version = hashlib.blake2b(payload, digest_size=16).hexdigest()
+            self._schema_version_cache = {id(schema): version}
+        return version
+
+    WARNING_CACHE_MAX_SIZE = 1024
+
     def _check_queryability_warnings(self, sql: str, schema: Dict[str, Any], sensitivity_rules: Optional[Dict] = None) -> List[Dict[str, str]]:
-        """Check if SQL uses non-queryable tables or columns, including forbidden fields."""
-        warnings = []
+        """
+        Check if SQL uses non-queryable tables or columns, including forbidden fields.
+        Results are cached per (normalized SQL, schema version, forbidden fields) so
+        repeated identical queries against a stable schema skip re-parsing entirely.
+        """
+        forbidden = tuple(sorted((sensitivity_rules or {}).get("forbiddenFields", [])))
+        cache_key = (self._normalize_sql(sql), self._schema_version(schema), forbidden)
+        cached = self._warning_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Dedupe by (type, entity): the same column referenced in SELECT, WHERE and
+        # ORDER BY would otherwise emit one warning per occurrence. First occurrence
+        # wins, which also keeps output ordering stable.
+        deduped: Dict[Tuple[str, str], Dict[str, str]] = {}
+        for w in self._iter_queryability_warnings(sql, schema, sensitivity_rules):
+            deduped.setdefault((w["type"], w["entity"]), w)
+        warnings = list(deduped.values())
+        if len(self._warning_cache) >= self.WARNING_CACHE_MAX_SIZE:
+            self._warning_cache.clear()
+        self._warning_cache[cache_key] = warnings
+        return warnings
+
+    async def check_queryability_batch(
+        self,
+        sqls: List[str],
+        schema: Dict[str, Any],
+        sensitivity_rules: Optional[Dict] = None
+    ) -> List[List[Dict[str, str]]]:
+        """
+        Validate many SQL statements against one schema concurrently (e.g. for
+        agent evaluation runs). The schema index is built once up front, then each
+        statement is checked in the default thread pool so parsing overlaps
+        instead of running serially on the event loop.
+        """
+        if not sqls:
+            return []
+        # Warm the shared per-schema caches before fanning out
+        self._get_schema_index(schema)
+        self._schema_version(schema)
+        return await asyncio.gather(*[
+            asyncio.to_thread(self._check_queryability_warnings, sql, schema, sensitivity_rules)
+            for sql in sqls
+        ])
+
+    def _get_queryability_checker(self, schema: Dict[str, Any], sensitivity_rules: Optional[Dict]) -> Any:
+        """
+        Return a checker closure specialized for one (schema, sensitivity_rules)
+        pair. The non-queryable sets and pre-lowered forbidden fields are bound
+        as frozensets in the closure, so per-query checking reduces to set
+        intersections over the extracted references — no schema or rules walk.
+        Memoized per object pair, latest pair only (same idiom as the other
+        per-schema caches).
+        """
+        key = (id(schema), id(sensitivity_rules))
+        cached = self._queryability_checker_cache.get(key)
+        if cached is not None:
+            return cached
+
+        non_queryable_by_table, _, non_queryable_tables, _ = self._get_schema_index(schema)
+        nq_tables = frozenset(non_queryable_tables)
+        nq_by_table = {t: frozenset(cols) for t, cols in non_queryable_by_table.items()}
+
+        # Partition forbidden fields once: qualified ones keep their bare column
+        # name alongside (the check accepts either form), unqualified ones are
+        # treated as table restrictions.
+        forbidden_columns: List[Tuple[str, str]] = []
+        forbidden_tables_set: Set[str] = set()
+        for field in (sensitivity_rules or {}).get("forbiddenFields", []):
+            f_lower = field.lower()
+            if "." in f_lower:
+                forbidden_columns.append((f_lower, f_lower.rsplit(".", 1)[1]))
+            else:
+                forbidden_tables_set.add(f_lower)
+        forbidden_cols = tuple(forbidden_columns)
+        forbidden_tables = frozenset(forbidden_tables_set)
+
+        def check(table_refs: Set[str], column_refs: Set[str]) -> Iterator[Dict[str, str]]:
+            for table_name in table_refs & nq_tables:
+                yield {
+                    "type": "non_queryable_table",
+                    "entity": table_name,
+                    "message": f"Table '{table_name}' is non-queryable.",
+                    "severity": "warning"
+                }
+
+            # Partition refs once: qualified refs grouped by table, naked refs as
+            # a set. Restriction checks are then set intersections, not scans.
+            column_refs_by_table: Dict[str, set] = {}
+            naked_refs = set()
+            for ref in column_refs:
+                if "." in ref:
+                    t_part, c_part = ref.rsplit(".", 1)
+                    column_refs_by_table.setdefault(t_part, set()).add(c_part)
+                else:
+                    naked_refs.add(ref)
+
+            for t_part, refs in column_refs_by_table.items():
+                for c_part in refs & nq_by_table.get(t_part, _EMPTY_SET):
+                    col_ref = f"{t_part}.{c_part}"
+                    yield {
+                        "type": "non_queryable_column",
+                        "entity": col_ref,
+                        "message": f"Column '{col_ref}' is non-queryable.",
+                        "severity": "warning"
+                    }
+
+            if naked_refs:
+                # Naked column reference: warn for any table that restricts this name
+                for t_part, cols in nq_by_table.items():
+                    for ref in naked_refs & cols:
+                        col_ref = f"{t_part}.{ref}"
+                        yield {
+                            "type": "non_queryable_column",
+                            "entity": col_ref,
+                            "message": f"Column '{col_ref}' is non-queryable.",
+                            "severity": "warning"
+                        }
+
+            for f_lower, bare_col in forbidden_cols:
+                if f_lower in column_refs or bare_col in column_refs:
+                    yield {
+                        "type": "non_queryable_column",
+                        "entity": f_lower,
+                        "message": f"Column '{f_lower}' is restricted.",
+                        "severity": "warning"
+                    }
+            for f_lower in forbidden_tables & table_refs:
+                yield {
+                    "type": "non_queryable_table",
+                    "entity": f_lower,
+                    "message": f"Table '{f_lower}' is restricted.",
+                    "severity": "warning"
+                }
+
+        self._queryability_checker_cache = {key: check}  # Keep only latest pair
+        return check
+
+    def _iter_queryability_warnings(self, sql: str, schema: Dict[str, Any], sensitivity_rules: Optional[Dict] = None) -> Iterator[Dict[str, str]]:
+        """Yield queryability warnings lazily so one-pass consumers avoid list buildup."""
         try:
-            parsed = sqlparse.parse(sql)
-            if not parsed: return warnings
-            statement = parsed[0]
-            table_refs = {t.lower() for t in self._extract_table_references(statement)}
-            column_refs = {c.lower() for c in self._extract_column_references(statement)}
-
-            # 1. Check isQueryable in schema metadata
-            for table in schema.get("tables", []):
-                table_name = table.get('name', '').lower()
-                if not table.get("isQueryable", True) and table_name in table_refs:
-                    warnings.append({
+            table_refs = {_lc(t) for t in self._extract_table_references(sql)}
+            column_refs = {_lc(c) for c in self._extract_column_references(sql)}
+            yield from self._get_queryability_checker(schema, sensitivity_rules)(table_refs, column_refs)
+        except Exception as e:
+            logger.debug("Failed to check queryability warnings, using regex fallback", error=str(e))
+            # Parsing failed: fall back to one pass of the precompiled alternation
+            # over the raw SQL so restricted tables are still flagged.
+            table_regex = self._get_schema_index(schema)[3]
+            if table_regex:
+                for match in table_regex.finditer(sql):
+                    table_name = match.group(1).lower()
+                    yield {
                         "type": "non_queryable_table",
                         "entity": table_name,
                         "message": f"Table '{table_name}' is non-queryable.",
                         "severity": "warning"
-                    })
-
-                for col in table.get("columns", []):
-                    if not col.get("isQueryable", True):
-                        col_ref = f"{table_name}.{col['name']}".lower()
-                        if col_ref in column_refs or col['name'].lower() in column_refs:
-                            warnings.append({
-                                "type": "non_queryable_column",
-                                "entity": col_ref,
-                                "message": f"Column '{col_ref}' is non-queryable.",
-                                "severity": "warning"
-                            })
-
-            # 2. Check forbiddenFields from sensitivity rules
-            if sensitivity_rules:
-                forbidden_fields = sensitivity_rules.get("forbiddenFields", [])
-                for field in forbidden_fields:
-                    f_lower = field.lower()
-                    if "." in f_lower:
-                        if f_lower in column_refs or f_lower.split(".")[-1] in column_refs:
-                            warnings.append({
-                                "type": "non_queryable_column",
-                                "entity": f_lower,
-                                "message": f"Column '{f_lower}' is restricted.",
-                                "severity": "warning"
-                            })
-                    else:
-                        if f_lower in table_refs:
-                            warnings.append({
-                                "type": "non_queryable_table",
-                                "entity": f_lower,
-                                "message": f"Table '{f_lower}' is restricted.",
-                                "severity": "warning"
-                            })
-        except Exception as e:
-            logger.debug("Failed to check queryability warnings", error=str(e))
-            pass
-        return warnings
+                    }
 
-    def _extract_table_references(self, statement) -> List[str]:
-        tables = []
-        from_seen = False
-        for token in statement.tokens:
-            if token.ttype is Keyword and token.value.upper() == 'FROM':
-                from_seen = True
-                continue
-            if from_seen:
-                if isinstance(token, Identifier): tables.append(token.get_real_name())
-                elif isinstance(token, IdentifierList):
-                    for identifier in token.get_identifiers(): tables.append(identifier.get_real_name())
-                elif token.ttype is Keyword and token.value.upper() in ('WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT'):
-                    from_seen = False
-            if token.ttype is Keyword and 'JOIN' in token.value.upper():
-                idx = statement.tokens.index(token)
-                for next_token in statement.tokens[idx+1:]:
-                    if isinstance(next_token, Identifier):
-                        tables.append(next_token.get_real_name())
-                        break
-        return [t for t in tables if t]
-
-    def _extract_column_references(self, statement) -> List[str]:
-        columns = []
-        def extract(token):
-            if isinstance(token, Identifier): columns.append(str(token))
-            elif hasattr(token, 'tokens'):
-                for t in token.tokens: extract(t)
-        extract(statement)
-        return columns
+    SQL_AST_CACHE_MAX_SIZE = 256
+
+    def _parse_sql_ast(self, sql: str) -> exp.Expression:
+        """Parse SQL into a sqlglot AST, memoized per SQL text."""
+        tree = self._sql_ast_cache.get(sql)
+        if tree is None:
+            tree = sqlglot.parse_one(sql)
+            if len(self._sql_ast_cache) >= self.SQL_AST_CACHE_MAX_SIZE:
+                self._sql_ast_cache.clear()
+            self._sql_ast_cache[sql] = tree
+        return tree
+
+    @staticmethod
+    def _fast_extract_tables(sql: str) -> List[str]:
+        """Single-pass compiled-regex scan for tables after FROM/JOIN (no AST build)."""
+        return list(_fast_extract_tables_cached(sql))
+
+    def _extract_table_references(self, sql: str) -> List[str]:
+        """Extract referenced table names; regex fast path, AST for CTE queries."""
+        # The scanner would misreport WITH aliases as tables, so CTE queries take
+        # the full (cached) AST path.
+        if sql.lstrip()[:5].upper() != 'WITH ':
+            tables = self._fast_extract_tables(sql)
+            if tables:
+                return tables
+        tree = self._parse_sql_ast(sql)
+        return [t.name for t in tree.find_all(exp.Table) if t.name]
+
+    def _extract_column_references(self, sql: str) -> List[str]:
+        """Extract referenced columns from the AST, qualified where the SQL qualifies them."""
+        tree = self._parse_sql_ast(sql)
+        columns = [
+            f"{c.table}.{c.name}" if c.table else c.name
+            for c in tree.find_all(exp.Column)
+        ]
+        return list(dict.fromkeys(columns))
 
     def _extract_sensitive_columns(self, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
-        sensitive_cols = []
-        for table in schema.get("tables", []):
-            t_name = table.get('name', '')
-            for col in table.get("columns", []):
-                if col.get("isSensitive", False):
-                    sensitive_cols.append({"table": t_name, "column": col["name"], "maskingStrategy": col.get("maskingStrategy", "full")})
-                if not col.get("isQueryable", True):
-                    sensitive_cols.append({"table": t_name, "column": col["name"], "maskingStrategy": "remove"})
-        return sensitive_cols
+        return self._get_schema_index(schema)[1]
 
     def _filter_non_queryable_columns(self, results: List[Dict[str, Any]], warnings: List[Dict[str, str]]) -> List[Dict[str, Any]]:
         if not results or not warnings: return results
-        non_queryable = {w["entity"].split(".")[-1].lower() for w in warnings if w["type"] == "non_queryable_column"}
-        if not non_queryable: return results
-        return [{k: v for k, v in row.items() if k.lower() not in non_queryable} for row in results]
+        non_queryable = {_lc(w["entity"].split(".")[-1]) for w in warnings if w["type"] == "non_queryable_column"}
+        return self._project_columns(results, non_queryable)
+
+    def _project_columns(self, results: List[Dict[str, Any]], non_queryable: set) -> List[Dict[str, Any]]:
+        if not results or not non_queryable: return results
+        # All rows share the same keys (DB cursor output), so compute the keep-list
+        # once from the first row instead of lowercasing every key of every row.
+        keep_keys = [k for k in results[0] if _lc(k) not in non_queryable]
+        if len(keep_keys) == len(results[0]):
+            return results
+        # Every column restricted: itemgetter would raise on zero keys
+        if not keep_keys:
+            return [{} for _ in results]
+        # itemgetter projects each row at C speed instead of a per-key
+        # comprehension. No pandas fast path: a DataFrame round-trip turns
+        # None into NaN and nullable int columns into floats, corrupting the
+        # JSON payload exactly on the large result sets it targeted.
+        if len(keep_keys) == 1:
+            key = keep_keys[0]
+            return [{key: row[key]} for row in results]
+        get = operator.itemgetter(*keep_keys)
+        return [dict(zip(keep_keys, get(row))) for row in results]
 
     def _build_schema_summary(self, schema: Optional[Dict]) -> str:
         """Build lightweight schema summary for faster NLU classification."""
@@ -329,18 +901,38 @@ class BaseNode:
             lines.append(line)
         return "Available Tables:\n" + "\n".join(lines)
 
+    def _get_fk_map(self, relationships: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        "source_table.source_col" -> "TargetTable.targetCol" lookup for FK hints,
+        memoized per relationships list so repeated schema formatting (builder,
+        corrector, refinements) doesn't rebuild it.
+        """
+        cached = self._fk_map_cache.get(id(relationships))
+        if cached is not None:
+            return cached
+        fk_map = {
+            f"{_lc(r['sourceTable'])}.{_lc(r['sourceColumn'])}": f"{r['targetTable']}.{r['targetColumn']}"
+            for r in relationships
+        }
+        self._fk_map_cache = {id(relationships): fk_map}  # Keep only latest schema
+        return fk_map
+
     def _format_schema_with_metadata(self, schema: Dict[str, Any], relationships: List[Dict[str, Any]] = None) -> str:
         """Format schema with metadata and FK relationships inline."""
         lines = []
-        fk_map = {f"{r['sourceTable'].lower()}.{r['sourceColumn'].lower()}": f"{r['targetTable']}.{r['targetColumn']}" for r in (relationships or [])}
+        # Computed once per call: skips building per-column log event dicts entirely
+        # when DEBUG is filtered out, which is the common production configuration.
+        debug_enabled = _stdlib_logger.isEnabledFor(logging.DEBUG)
+        fk_map = self._get_fk_map(relationships or [])
         for table in schema.get("tables", []):
             if not table.get("isQueryable", True): continue
             t_name = table.get('name', 'unknown')
             t_line = f"Table: {t_name}" + (f" - {table['description']}" if table.get('description') else "")
             lines.append(t_line)
             for col in table.get("columns", []):
-                if not col.get("isQueryable", True): 
-                    logger.debug("Skipping non-queryable column", table=t_name, column=col.get("name"))
+                if not col.get("isQueryable", True):
+                    if debug_enabled:
+                        logger.debug("Skipping non-queryable column", table=t_name, column=col.get("name"))
                     continue
                 c_name = col['name']
                 c_line = f"  - {c_name} ({col.get('type', 'unknown')})"
@@ -352,14 +944,16 @@ class BaseNode:
                     target_table = target_ref.split('.')[0]
                     c_line += f" → JOIN {target_table} ON {t_name}.{c_name} = {target_ref} ← FK is in {t_name}"
                 lines.append(c_line)
-                logger.debug("Included column in schema context", table=t_name, column=c_name)
+                if debug_enabled:
+                    logger.debug("Included column in schema context", table=t_name, column=c_name)
             lines.append("")
         return "\n".join(lines)
     def _build_schema_context(self, state: QueryState) -> str:
         """Build schema context for LLM using best available sources."""
         # Preference: Pinned schema takes priority for corrections
         pinned_schema = state.get("pinned_schema")
-        
+        schema_metadata = state.get("schema_metadata") or {}
+
         if pinned_schema:
             relevant_tables = pinned_schema
             # For pinned schema (corrector), we typically stay focused, but expansion
@@ -367,41 +961,40 @@ class BaseNode:
         else:
             # Merge existing relevant schema with new intent-based tables
             search_tables = state.get("relevant_schema") or []
-            intent_table_names = {name.lower() for name in (state.get("relevant_tables_from_intent") or [])}
-            all_tables = state.get("schema_metadata", {}).get("tables", [])
-            
+            intent_table_names = {_lc(name) for name in (state.get("relevant_tables_from_intent") or [])}
+
             # Map intent names to actual table objects if they aren't already in search_tables
-            existing_names = {(t.get("name") or t.get("tableName", "")).lower() for t in search_tables}
+            tables_by_lower_name, _ = self._get_relationship_index(schema_metadata)
+            existing_names = {_lc(t.get("name") or t.get("tableName", "")) for t in search_tables}
             new_intent_tables = [
-                t for t in all_tables 
-                if (t.get("name") or t.get("tableName", "")).lower() in intent_table_names 
-                and (t.get("name") or t.get("tableName", "")).lower() not in existing_names
+                tables_by_lower_name[name]
+                for name in intent_table_names
+                if name in tables_by_lower_name and name not in existing_names
             ]
-            
+
             relevant_tables = search_tables + new_intent_tables
 
             # Only apply Degree-1 expansion if confidence is low (< 0.9)
             # This prevents polluting the context with extra tables when orchestrator is sure.
-            confidence = state.get("intent", {}).get("confidence", 0)
-            if relevant_tables and confidence < 0.9:
-                relevant_tables = self._expand_with_related_tables(relevant_tables, all_tables, state["schema_metadata"])
+            intent = state.get("intent") or {}
+            if relevant_tables and intent.get("confidence", 0) < 0.9:
+                relevant_tables = self._expand_with_related_tables(
+                    relevant_tables, schema_metadata.get("tables", []), schema_metadata
+                )
 
         if not relevant_tables:
             # Fallback to full schema if search found nothing
-            schema_to_format = state["schema_metadata"]
+            schema_to_format = schema_metadata
         else:
             # Create sub-schema containing only relevant tables
-            schema_to_format = {
-                "tables": relevant_tables,
-                "relationships": self._filter_relevant_relationships(
-                    state["schema_metadata"].get("relationships", []),
-                    relevant_tables
-                )
-            }
+            schema_to_format = {"tables": relevant_tables}
 
+        # Pass the full relationship list: the formatter only looks up FKs for the
+        # tables it formats, so the output matches a pre-filtered list, and the
+        # stable list object keeps the memoized fk_map effective across calls.
         return self._format_schema_with_metadata(
             schema_to_format,
-            schema_to_format.get("relationships")
+            schema_metadata.get("relationships", [])
         )
 
     def _filter_relevant_relationships(self, relationships: List[Dict], relevant_tables: List[Dict]) -> List[Dict]:
@@ -416,146 +1009,202 @@ class BaseNode:
                 filtered.append(rel)
         return filtered
 
+    def _get_sensitivity_index(self, sensitivity_rules: Optional[Dict]) -> Tuple[frozenset, frozenset, Tuple, Tuple]:
+        """
+        Partition forbiddenFields once per rules object instead of per call:
+        - forbidden_tables_lower / forbidden_cols_lower: lowercase sets for membership checks
+        - table_fields: (display name, lowercase) for unqualified entries
+        - col_fields: (table display, column display, table lowercase) for qualified entries
+        """
+        key = id(sensitivity_rules)
+        cached = self._sensitivity_index_cache.get(key)
+        if cached is not None:
+            return cached
+
+        forbidden_tables_lower = set()
+        forbidden_cols_lower = set()
+        table_fields = []
+        col_fields = []
+        for field in (sensitivity_rules or {}).get("forbiddenFields", []):
+            if "." in field:
+                forbidden_cols_lower.add(field.lower())
+                t_part, c_part = field.split(".", 1)
+                col_fields.append((t_part, c_part, _lc(t_part)))
+            else:
+                forbidden_tables_lower.add(field.lower())
+                table_fields.append((field, _lc(field)))
+
+        index = (
+            frozenset(forbidden_tables_lower),
+            frozenset(forbidden_cols_lower),
+            tuple(table_fields),
+            tuple(col_fields),
+        )
+        self._sensitivity_index_cache = {key: index}  # Keep only latest rules
+        return index
+
     def _build_restricted_context(self, state: QueryState, table_names_filter: List[str] = None) -> str:
         """Build context for non-queryable tables and columns, optionally filtered by table names."""
         schema = state.get("schema_metadata", {})
         if not schema:
             return ""
-        
+
+        # The unfiltered render (orchestrator path) changes only when the agent
+        # schema or sensitivity rules are edited; memoized per object pair so
+        # repeat turns reuse the identical string (which also keeps the prompt
+        # prefix byte-stable for provider caching). Filtered renders vary per
+        # query and are built fresh.
+        memo_key = None
+        if table_names_filter is None:
+            memo_key = (id(schema), id(state.get("sensitivity_rules")))
+            cached = self._restricted_context_cache.get(memo_key)
+            if cached is not None:
+                return cached
+
         # Normalize filter to set for efficient lookup if provided
         table_filter = {name.lower() for name in table_names_filter} if table_names_filter else None
         
-        restricted_tables = []
-        restricted_columns = []
-        
-        # 1. Check isQueryable in schema metadata
-        for table in schema.get("tables", []):
-            t_name = table.get("name") or table.get("tableName", "unknown")
-            
+        # Sets from the start: dedupe is O(1) per insert, and columns are grouped
+        # by table as they are found instead of via a second pass.
+        restricted_tables: set = set()
+        grouped_cols: Dict[str, set] = defaultdict(set)
+
+        # 1. Check isQueryable via the normalized schema (names pre-lowercased)
+        for table in self._normalize_schema(schema):
+            t_name = table.name or "unknown"
+
             # Filter logic: if filter is provided, only check if table is in the filter
-            if table_filter and t_name.lower() not in table_filter:
+            if table_filter and table.name_lower not in table_filter:
                 continue
-                
-            if not table.get("isQueryable", True):
-                restricted_tables.append(t_name)
-            else:
-                for col in table.get("columns", []):
-                    if not col.get("isQueryable", True):
-                        c_name = col.get("name") or col.get("columnName", "unknown")
-                        restricted_columns.append(f"{t_name}.{c_name}")
-
-        # 2. Add forbiddenFields from sensitivity rules
-        forbidden_fields = state.get("sensitivity_rules", {}).get("forbiddenFields", [])
-        for field in forbidden_fields:
-            if "." in field:
-                t_part, c_part = field.split(".", 1)
-                if not table_filter or t_part.lower() in table_filter:
-                    if field not in restricted_columns:
-                        restricted_columns.append(field)
+
+            if not table.queryable:
+                restricted_tables.add(t_name)
             else:
-                # If it's just a table name in forbiddenFields
-                if not table_filter or field.lower() in table_filter:
-                    if field not in restricted_tables:
-                        restricted_tables.append(field)
-        
+                for col in table.columns:
+                    if not col.queryable:
+                        grouped_cols[t_name].add(col.name or 'unknown')
+
+        # 2. Add forbiddenFields from sensitivity rules (partitioned once per rules object)
+        _, _, table_fields, col_fields = self._get_sensitivity_index(state.get("sensitivity_rules"))
+        for t_part, c_part, t_lower in col_fields:
+            if not table_filter or t_lower in table_filter:
+                grouped_cols[t_part].add(c_part)
+        for field, f_lower in table_fields:
+            # If it's just a table name in forbiddenFields
+            if not table_filter or f_lower in table_filter:
+                restricted_tables.add(field)
+
         lines = []
         lines.append("### FULLY RESTRICTED TABLES (Blocking: Do NOT query or mention these) ###")
         if restricted_tables:
-            for t in sorted(list(set(restricted_tables))):
+            for t in sorted(restricted_tables):
                 lines.append(f"- {t}")
         else:
             lines.append("- [None]")
-        
+
         lines.append("")
         lines.append("### TABLES WITH RESTRICTED COLUMNS (Partial Access: These tables ARE queryable, but listed columns MUST be omitted) ###")
-        if restricted_columns:
-            # Group by table for cleaner presentation
-            grouped_cols = {}
-            for col_ref in restricted_columns:
-                if "." in col_ref:
-                    t, c = col_ref.split(".", 1)
-                    if t not in grouped_cols: grouped_cols[t] = []
-                    grouped_cols[t].append(c)
-                else:
-                    if "Miscellaneous" not in grouped_cols: grouped_cols["Miscellaneous"] = []
-                    grouped_cols["Miscellaneous"].append(col_ref)
-            
-            for t in sorted(grouped_cols.keys()):
-                cols = ", ".join(sorted(list(set(grouped_cols[t]))))
-                lines.append(f"- {t}: {cols}")
+        if grouped_cols:
+            for t in sorted(grouped_cols):
+                lines.append(f"- {t}: {', '.join(sorted(grouped_cols[t]))}")
         else:
             lines.append("- [None]")
-                
-        return "\n".join(lines)
+
+        result = "\n".join(lines)
+        if memo_key is not None:
+            self._restricted_context_cache = {memo_key: result}  # Keep only latest
+        return result
 
     def _is_common_column(self, col_name: str) -> bool:
         """Helper to identify generic columns (id, timestamp, etc.)"""
-        return col_name.lower() in self.COMMON_COLUMN_NAMES or col_name.lower().endswith('_id')
+        return _is_common_column(col_name)
 
     def _expand_with_related_tables(self, initial_tables: List[Dict], all_tables: List[Dict], schema_metadata: Dict) -> List[Dict]:
         """Degree-1 Expansion: Include tables directly related via FK."""
         if not initial_tables: return []
-        
-        expanded_names = {t["name"].lower() for t in initial_tables}
-        relationships = schema_metadata.get("relationships", [])
-        all_tables_by_name = {t["name"].lower(): t for t in all_tables}
-        
-        new_tables = list(initial_tables)
-        for rel in relationships:
-            src = rel.get("sourceTable", "").lower()
-            tgt = rel.get("targetTable", "").lower()
-            
-            # If source is in, add target
-            if src in expanded_names and tgt not in expanded_names:
-                if tgt in all_tables_by_name:
-                    new_tables.append(all_tables_by_name[tgt])
-                    expanded_names.add(tgt)
-            # If target is in, add source
-            elif tgt in expanded_names and src not in expanded_names:
-                if src in all_tables_by_name:
-                    new_tables.append(all_tables_by_name[src])
-                    expanded_names.add(src)
-        
-        return new_tables
 
-    def _extract_custom_prompts(self, schema: Dict, user_message: str) -> str:
-        """Extract domain-specific hints from schema metadata."""
-        # Legacy implementation used keyword matching on user_message
-        hints = []
-        user_message_lower = user_message.lower()
-        
-        # Check table-level hints
-        for table in schema.get("tables", []):
-            t_name = table.get("name", "").lower()
-            if t_name in user_message_lower:
-                if table.get("prompt_hint"):
-                    hints.append(f"Hint for {t_name}: {table['prompt_hint']}")
-                
-        # Check column-level hints in queryable tables only
+        frontier = {_lc(t["name"]) for t in initial_tables}
+        tables_by_lower_name, fk_adjacency = self._get_relationship_index(schema_metadata)
+        # Both call sites pass the schema's own table list, so the memoized map
+        # applies; rebuild only if a caller ever passes a different list
+        if all_tables is schema_metadata.get("tables"):
+            all_tables_by_name = tables_by_lower_name
+        else:
+            all_tables_by_name = {_lc(t["name"]): t for t in all_tables}
+
+        # Union the neighbor tuples of the frontier in one sweep; cost scales with
+        # the FK degree of the selected tables, not the schema's relationship count.
+        neighbors: set = set()
+        for name in frontier:
+            neighbors.update(fk_adjacency.get(name, ()))
+        neighbors -= frontier
+
+        return list(initial_tables) + [
+            all_tables_by_name[n] for n in neighbors if n in all_tables_by_name
+        ]
+
+    def _get_prompt_hint_index(self, schema: Dict) -> Tuple[Tuple[str, str], ...]:
+        """
+        (match token, rendered hint line) pairs for every prompt_hint in the
+        schema, memoized per schema object. Hints are sparse, so the per-message
+        filter then runs over a handful of pairs instead of the whole schema.
+        """
+        cached = self._prompt_hint_index_cache.get(id(schema))
+        if cached is not None:
+            return cached
+
+        pairs = []
         for table in schema.get("tables", []):
+            t_name = _lc(table.get("name", ""))
+            if table.get("prompt_hint"):
+                pairs.append((t_name, f"Hint for {t_name}: {table['prompt_hint']}"))
+            # Column-level hints in queryable tables only
             if not table.get("isQueryable", True): continue
             for col in table.get("columns", []):
-                c_name = col.get("name", "").lower()
-                if c_name in user_message_lower and col.get("prompt_hint"):
-                    hints.append(f"Hint for {table['name']}.{c_name}: {col['prompt_hint']}")
-                    
+                if col.get("prompt_hint"):
+                    c_name = _lc(col.get("name", ""))
+                    pairs.append((c_name, f"Hint for {table['name']}.{c_name}: {col['prompt_hint']}"))
+
+        index = tuple(pairs)
+        self._prompt_hint_index_cache = {id(schema): index}  # Keep only latest schema
+        return index
+
+    def _extract_custom_prompts(self, schema: Dict, user_message: str) -> str:
+        """Extract domain-specific hints from schema metadata."""
+        # Keyword matching on whole message tokens: set membership replaces the
+        # old substring scan, so "user" no longer matches inside "user_profile".
+        hint_index = self._get_prompt_hint_index(schema)
+        if not hint_index:
+            return ""
+        tokens = frozenset(_WORD_RE.findall(user_message.lower()))
+        hints = [line for token, line in hint_index if token in tokens]
         return "\n".join(hints) if hints else ""
-    def _extract_tables_from_query(self, canonical_query: Dict) -> Set[str]:
-        """Extract all table names (normalized to lower case) used in the canonical query."""
-        tables = set()
-        if not canonical_query: return tables
+    def _extract_tables_from_query(self, canonical_query: Dict) -> frozenset:
+        """
+        Extract all table names (normalized to lower case) used in the canonical
+        query, memoized per query object. The shape-tolerant primary_table branch
+        stays: canonical_query is LLM output (QueryStructure allows extra fields),
+        so primary_table may arrive as a dict or a bare string.
+        """
+        if not canonical_query: return _EMPTY_SET
+        cached = self._query_tables_cache.get(id(canonical_query))
+        # Identity-checked: the instance outlives the turn, and a later turn's
+        # dict can land on a freed address. Holding the dict pins its id.
+        if cached is not None and cached[0] is canonical_query:
+            return cached[1]
 
-        # Primary table
+        tables = set()
         pt = canonical_query.get("primary_table")
         if pt:
             pt_name = pt.get("name") if isinstance(pt, dict) else str(pt)
-            if pt_name: tables.add(pt_name.lower())
-
-        # Joins
+            if pt_name: tables.add(_lc(pt_name))
         for join in canonical_query.get("joins", []):
             j_table = join.get("table")
-            if j_table: tables.add(j_table.lower())
-        return tables
+            if j_table: tables.add(_lc(j_table))
+
+        result = frozenset(tables)
+        self._query_tables_cache = {id(canonical_query): (canonical_query, result)}  # Keep only latest query
+        return result
 
     def _calculate_pinned_schema(self, state: QueryState) -> List[Dict]:
         """
@@ -563,26 +1212,28 @@ class BaseNode:
         Strictly includes only these tables, their columns, and mutual relationships.
         """
         used_tables = set()
-        
+
         # 1. Try extracting from generated SQL first (most accurate for corrector)
-        if state.get("generated_sql"):
+        generated_sql = state.get("generated_sql")
+        if generated_sql:
             try:
-                parsed = sqlparse.parse(state["generated_sql"])
-                if parsed:
-                    used_tables = set(t.lower() for t in self._extract_table_references(parsed[0]))
+                used_tables = {_lc(t) for t in self._extract_table_references(generated_sql)}
             except Exception as e:
                 logger.warning("Failed to extract tables from SQL", error=str(e))
 
         # 2. Fallback to canonical query if SQL extraction found nothing
-        if not used_tables and state.get("canonical_query"):
-            used_tables = self._extract_tables_from_query(state["canonical_query"])
+        if not used_tables:
+            canonical_query = state.get("canonical_query")
+            if canonical_query:
+                used_tables = self._extract_tables_from_query(canonical_query)
 
         if not used_tables:
             return []
 
         # 3. Filter schema metadata
-        all_tables = state.get("schema_metadata", {}).get("tables", [])
-        pinned_schema = [t for t in all_tables if (t.get("name") or t.get("tableName", "")).lower() in used_tables]
+        schema_metadata = state.get("schema_metadata") or {}
+        all_tables = schema_metadata.get("tables", [])
+        pinned_schema = [t for t in all_tables if _lc(t.get("name") or t.get("tableName", "")) in used_tables]
         
         logger.info(
             "Pinned schema calculated",
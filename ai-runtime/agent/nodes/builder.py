@@ -1,61 +1,191 @@
+import asyncio
+import hashlib
+import json
+import re
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import structlog
-import json
 from langchain_core.messages import SystemMessage, HumanMessage
 
-from agent.nodes.base import BaseNode, QueryState
-from agent.prompts import build_query_builder_prompt
-from agent.utils import format_chat_history
+from agent.nodes.base import BaseNode, QueryState, _json_for_prompt
+from services.llm_response_cache import LLMResponseCache
+from agent.prompts.builders import (
+    build_query_builder_segments,
+    render_prompt,
+    QUERY_BUILDER_TURN_CONTEXT_SEGMENTS
+)
 
 logger = structlog.get_logger()
 
+# Query plans keyed by canonical intent shape: the number of distinct intent
+# structures is far smaller than the number of user turns, so repeat shapes
+# skip the Builder LLM call entirely. Module-level (shared across agents,
+# surviving pipeline rebuilds) and cleared wholesale when full, like the
+# summary caches.
+_PLAN_CACHE_MAX_SIZE = 256
+_query_plan_cache: Dict[str, Dict[str, Any]] = {}
+
+# Cross-phrasing tier: "show me all active users" and "list active users"
+# produce the same plan, but their intent shapes differ slightly, so the exact
+# plan cache misses. Embedding similarity (>= 0.92) over the normalized user
+# message, bucketed per agent + schema version + dialect so a hit can never
+# cross schemas. Skipped for refinements, direct SQL and date-relative
+# questions, which depend on per-turn context.
+_semantic_plan_cache = LLMResponseCache(maxsize=512, ttl_seconds=3600, similarity_threshold=0.92)
+_semantic_key_by_plan: Dict[str, str] = {}
+_TIME_RELATIVE_RE = re.compile(
+    r"\b(today|yesterday|tomorrow|now|current|recent|latest|"
+    r"(this|last|next|past)\s+(hour|day|week|month|quarter|year))\b",
+    re.IGNORECASE
+)
+
+
+def evict_query_plan(plan_cache_key: Optional[str]):
+    """Drop a cached plan whose SQL failed validation or execution."""
+    if plan_cache_key and _query_plan_cache.pop(plan_cache_key, None) is not None:
+        logger.info("Evicted failed query plan from cache", plan_cache_key=plan_cache_key)
+    if plan_cache_key:
+        semantic_key = _semantic_key_by_plan.pop(plan_cache_key, None)
+        if semantic_key:
+            _semantic_plan_cache.cache.pop(semantic_key, None)
+
+
 class BuilderNodes(BaseNode):
+    __slots__ = ()
+
     async def query_builder(self, state: QueryState) -> Dict:
         """Generate canonical query structure with full schema context and custom prompts"""
         if state.get("error") or state.get("no_match"): return {}
 
         intent_data = state.get("intent") or {}
         
-        # 1. Build rich schema context (tables, columns, FK relationships)
-        schema_context = self._build_schema_context(state)
-        # Escape curly braces for .format() safety
-        schema_context_escaped = schema_context.replace("{", "{{").replace("}", "}}")
-        
-        # 2. Extract context
+        # 1. Extract context flags
         is_refinement = state.get("is_refinement", False)
         is_direct_sql = state.get("is_direct_sql", False)
         relevant_tables = [t.get("name") or t.get("tableName") for t in (state.get("relevant_schema") or []) if t]
-        restricted_context = self._build_restricted_context(state, table_names_filter=relevant_tables)
-        
-        # 3. Build dynamic system prompt
-        system_prompt_template = build_query_builder_prompt(
-            dialect=state["sql_dialect"], 
-            is_refinement=is_refinement,
-            is_direct_sql=is_direct_sql
+
+        # 1a. Deterministic fast path: trivial refinements ("top 10", "sort by
+        # date") are patched onto the previous SQL directly, with no builder
+        # LLM call. The validator still checks the result downstream.
+        if is_refinement and not is_direct_sql:
+            fast_sql = self._apply_simple_refinement(state, intent_data)
+            if fast_sql:
+                logger.info("Simple refinement fast path applied, skipping builder LLM",
+                            sql_preview=fast_sql[:50])
+                prev_canonical = state.get("previous_query") if isinstance(state.get("previous_query"), dict) else {}
+                return {
+                    "canonical_query": {**prev_canonical, "generated_sql": fast_sql},
+                    "generated_sql": fast_sql,
+                    "sql_explanation": prev_canonical.get("sql_explanation"),
+                    "correction_note": None,
+                    "current_step": "query_built",
+                    "visual_confirmation": f"Generated SQL: {fast_sql}"
+                }
+
+        # 1b. Plan cache: hash the canonical intent shape (plus everything else
+        # that steers the SQL — schema version, dialect, mode flags). A repeat
+        # shape reuses the stored QueryStructure and skips the LLM call.
+        plan_key_payload = {
+            "schema_version": self._schema_version(state["schema_metadata"]),
+            "dialect": state["sql_dialect"],
+            "is_refinement": is_refinement,
+            "is_direct_sql": is_direct_sql,
+            "intent_summary": intent_data.get("intent_summary") or state.get("user_message"),
+            "base_query_to_modify": intent_data.get("base_query_to_modify") or state.get("previous_sql"),
+            "changes": intent_data.get("changes"),
+            "required_tables": intent_data.get("required_tables"),
+            "extracted_timeframe": intent_data.get("extracted_timeframe"),
+        }
+        plan_cache_key = hashlib.blake2b(
+            json.dumps(plan_key_payload, sort_keys=True, default=str).encode(),
+            digest_size=16
+        ).hexdigest()
+        cached_plan = _query_plan_cache.get(plan_cache_key)
+        if cached_plan is not None:
+            logger.info("Query plan cache hit, skipping builder LLM",
+                        sql_preview=(cached_plan.get("generated_sql") or "None")[:50])
+            return {**cached_plan, "plan_cache_key": plan_cache_key}
+
+        # 1c. Semantic tier: a differently-phrased version of an already-built
+        # question reuses its plan. The timeframe guard keeps date-sensitive
+        # questions out of the cache (their SQL depends on the reference date).
+        semantic_key = None
+        semantic_bucket = None
+        message_embedding = None
+        timeframe_specified = (intent_data.get("extracted_timeframe") or {}).get("specified")
+        if not is_refinement and not is_direct_sql and not timeframe_specified \
+           and not _TIME_RELATIVE_RE.search(state["user_message"]):
+            normalized_message = " ".join(state["user_message"].lower().split())
+            semantic_bucket = (
+                f"semantic_plan:{state['agent_id']}:"
+                f"{self._schema_version(state['schema_metadata'])}:{state['sql_dialect']}"
+            )
+            semantic_key = hashlib.sha256(f"{semantic_bucket}|{normalized_message}".encode()).hexdigest()
+            entry = _semantic_plan_cache.get(semantic_key)
+            if entry is None:
+                try:
+                    # Usually already cached: schema_search embedded this text
+                    message_embedding = await self.embedding_service.generate_single_embedding(
+                        state["user_message"]
+                    )
+                except Exception as e:
+                    logger.debug("Message embedding for semantic plan cache failed", error=str(e))
+                    message_embedding = None
+                if message_embedding:
+                    entry = _semantic_plan_cache.get_similar(semantic_bucket, message_embedding)
+            if entry is not None:
+                logger.info("Semantic plan cache hit, skipping builder LLM",
+                            sql_preview=(entry["response"].get("generated_sql") or "None")[:50])
+                # Register the matched entry under THIS request's plan key too:
+                # if the served plan later fails validation/execution,
+                # evict_query_plan must reach the semantic entry, not just the
+                # originating request's key.
+                _semantic_key_by_plan[plan_cache_key] = entry["key"]
+                return {**entry["response"], "plan_cache_key": plan_cache_key}
+
+        # 2. Build the three independent context blocks concurrently in the
+        # default thread pool: on large schemas these are the CPU-heavy part of
+        # the node, and overlapping them keeps the event loop free for other
+        # requests. No brace escaping needed: segment rendering never re-parses
+        # values.
+        schema_context, restricted_context, custom_prompts = await asyncio.gather(
+            asyncio.to_thread(self._build_schema_context, state),
+            asyncio.to_thread(self._build_restricted_context, state, table_names_filter=relevant_tables),
+            asyncio.to_thread(self._extract_custom_prompts, state["schema_metadata"], state["user_message"])
         )
-        
-        # 4. Format prompt
-        system_prompt = system_prompt_template.format(
-            schema_context=schema_context_escaped,
-            restricted_entities=restricted_context,
-            chat_history=format_chat_history(state.get("context", [])),
+
+        # 3. Build dynamic system prompt (precompiled segments, cached per variant)
+        system_prompt_segments = build_query_builder_segments(
+            state["sql_dialect"],
+            is_refinement,
+            is_direct_sql
+        )
+
+        # 4. Render prompts: stable agent-level prefix, then per-turn context.
+        # The split keeps the first system message byte-identical across turns
+        # for a given schema selection, so provider prompt caching hits it.
+        system_prompt = render_prompt(system_prompt_segments, {
+            "schema_context": schema_context,
+            "restricted_entities": restricted_context
+        })
+        turn_context = render_prompt(QUERY_BUILDER_TURN_CONTEXT_SEGMENTS, dict(
+            chat_history=self._format_chat_history(state.get("context", [])),
             current_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             # Intent Analysis mapping
             intent_summary=intent_data.get("intent_summary") or state.get("user_message") or "None",
             is_refinement=is_refinement,
             is_direct_sql=is_direct_sql,
             base_query_to_modify=intent_data.get("base_query_to_modify") or state.get("previous_sql") or "N/A",
-            changes=json.dumps(intent_data.get("changes") or {}, indent=2),
-            required_tables=json.dumps(intent_data.get("required_tables") or [], indent=2),
-            extracted_timeframe=json.dumps(intent_data.get("extracted_timeframe") or {}, indent=2),
+            changes=_json_for_prompt(intent_data.get("changes") or {}),
+            required_tables=_json_for_prompt(intent_data.get("required_tables") or []),
+            extracted_timeframe=_json_for_prompt(intent_data.get("extracted_timeframe") or {}),
             assumptions_made=intent_data.get("assumptions_made") or "None"
-        )
+        ))
 
-        # 5. Extract domain-specific prompts/hints
-        custom_prompts = self._extract_custom_prompts(state["schema_metadata"], state["user_message"])
+        # 5. Append domain-specific prompts/hints (message-dependent, so they
+        # belong in the per-turn message, not the cacheable prefix)
         if custom_prompts:
-            system_prompt += "\n\n### ADDITIONAL DOMAIN CONTEXT ###\n" + custom_prompts
+            turn_context += "\n\n### ADDITIONAL DOMAIN CONTEXT ###\n" + custom_prompts
 
         try:
             user_content = state["user_message"]
@@ -64,7 +194,8 @@ class BuilderNodes(BaseNode):
             
             response = await self._call_llm_with_logging(
                 messages=[
-                    SystemMessage(content=system_prompt),
+                    self._static_system_message(system_prompt),
+                    SystemMessage(content=turn_context),
                     HumanMessage(content=user_content)
                 ],
                 node_name="query_builder",
@@ -76,7 +207,7 @@ class BuilderNodes(BaseNode):
                 return {"error": "Failed to generate query structure", "current_step": "error"}
 
             logger.info("Query builder completed", sql_preview=response.generated_sql[:50] if response.generated_sql else "None")
-            return {
+            result = {
                 "canonical_query": response.model_dump(),
                 "generated_sql": response.generated_sql,
                 "sql_explanation": getattr(response, "sql_explanation", None),
@@ -84,6 +215,56 @@ class BuilderNodes(BaseNode):
                 "current_step": "query_built",
                 "visual_confirmation": f"Generated SQL: {response.generated_sql}" if response.generated_sql else "No SQL generated"
             }
+            if response.generated_sql:
+                if len(_query_plan_cache) >= _PLAN_CACHE_MAX_SIZE:
+                    _query_plan_cache.clear()
+                    _semantic_key_by_plan.clear()
+                _query_plan_cache[plan_cache_key] = result
+                if semantic_key:
+                    _semantic_plan_cache.put(
+                        semantic_key, semantic_bucket, result, embedding=message_embedding
+                    )
+                    # So a validation/execution failure evicts this entry too
+                    _semantic_key_by_plan[plan_cache_key] = semantic_key
+            return {**result, "plan_cache_key": plan_cache_key}
         except Exception as e:
             logger.error("Query builder failed", error=str(e))
             return {"error": str(e), "current_step": "error"}
+
+    def _apply_simple_refinement(self, state: QueryState, intent_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Patch the previous SQL deterministically when the orchestrator's
+        structured changes amount to a new LIMIT and/or ORDER BY only. Returns
+        the refined SQL, or None when the changes need real query building
+        (filters, columns, aggregation) and the LLM path should run.
+        """
+        if intent_data.get("refinement_complexity") != "simple":
+            return None
+        previous_sql = intent_data.get("base_query_to_modify") or state.get("previous_sql")
+        if not previous_sql:
+            return None
+        changes = intent_data.get("changes") or {}
+        change_limit = changes.get("change_limit")
+        change_sort = changes.get("change_sort") or {}
+        if not change_limit and not change_sort.get("column"):
+            return None
+        if any(changes.get(k) for k in ("add_filters", "remove_filters", "add_columns", "remove_columns")):
+            return None
+
+        dialect = state["sql_dialect"]
+        glot_dialect = "postgres" if dialect.lower() == "postgresql" else dialect.lower()
+        try:
+            from sqlglot import exp
+            from mcp_tools.sql_validator import parse_sql_cached
+            expression = parse_sql_cached(previous_sql.strip().rstrip(";"), glot_dialect).copy()
+            if not isinstance(expression, exp.Select):
+                return None
+            if change_sort.get("column"):
+                direction = " DESC" if str(change_sort.get("order", "")).lower().startswith("desc") else ""
+                expression = expression.order_by(f"{change_sort['column']}{direction}", append=False)
+            if change_limit:
+                expression = expression.limit(int(change_limit))
+            return expression.sql(dialect=glot_dialect)
+        except Exception as e:
+            logger.debug("Simple refinement fast path failed; using builder LLM", error=str(e))
+            return None
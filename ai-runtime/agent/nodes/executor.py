@@ -1,4 +1,7 @@
-from typing import Dict, Any, List, Optional
+import asyncio
+import hashlib
+import json
+from typing import Dict, Any, List, Optional, Tuple
 import structlog
 from mcp_tools.sql_executor import SQLExecutor
 
@@ -6,23 +9,84 @@ from agent.nodes.base import BaseNode, QueryState
 
 logger = structlog.get_logger()
 
+# Long-lived executors keyed by agent_id, stored with a hash of the connection
+# details they were built from. Module-level so the executor and validator
+# nodes share one pool per agent and it survives pipeline rebuilds; each
+# executor holds a driver connection pool, removing the per-query TCP/auth
+# handshake. The
+# details themselves stay Redis-cached, so re-reading them per query is cheap
+# — and the hash comparison means rotated credentials or a moved host replace
+# the stale pool on the next query instead of failing until restart.
+_executor_cache: Dict[str, Tuple[str, SQLExecutor]] = {}
+_executor_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _conn_details_hash(conn_details: Dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(conn_details, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+async def invalidate_sql_executor(agent_id: str):
+    """Drop (and close) the cached executor — called on connection failures."""
+    entry = _executor_cache.pop(agent_id, None)
+    _executor_locks.pop(agent_id, None)
+    if entry is not None:
+        await entry[1].close()
+        logger.info("SQL executor invalidated", agent_id=agent_id)
+
+
+async def get_shared_sql_executor(system_db, agent_id: str) -> SQLExecutor:
+    """Return the cached per-agent SQLExecutor, creating it on first use.
+
+    Shared by the executor and validator nodes so sandbox validation reuses
+    the same driver pool instead of opening a fresh pool per call. The
+    connection details are re-read each call (Redis-cached) and compared by
+    hash, so a config change naturally misses and rebuilds the pool.
+    """
+    conn_details = await system_db.get_connection_details(agent_id)
+    details_hash = _conn_details_hash(conn_details)
+    entry = _executor_cache.get(agent_id)
+    if entry is not None and entry[0] == details_hash:
+        return entry[1]
+    # Per-agent lock so concurrent first queries don't each open their own pool
+    lock = _executor_locks.setdefault(agent_id, asyncio.Lock())
+    async with lock:
+        entry = _executor_cache.get(agent_id)
+        if entry is not None and entry[0] == details_hash:
+            return entry[1]
+        if entry is not None:
+            # Details changed: close the stale pool before replacing it
+            logger.info("Connection details changed, rebuilding SQL executor", agent_id=agent_id)
+            await entry[1].close()
+        executor = SQLExecutor(conn_details)
+        _executor_cache[agent_id] = (details_hash, executor)
+    return executor
+
+
 class ExecutorNodes(BaseNode):
+    __slots__ = ()
+
+    async def _get_sql_executor(self, agent_id: str) -> SQLExecutor:
+        """Return the cached per-agent SQLExecutor, creating it on first use."""
+        return await get_shared_sql_executor(self.system_db, agent_id)
+
     async def sql_executor(self, state: QueryState) -> Dict:
         """Execute/Validate SQL query and log telemetry"""
         if state.get("error") or not state.get("generated_sql"):
             return {}
 
         try:
-            conn_details = await self.system_db.get_connection_details(state["agent_id"])
-            executor = SQLExecutor(conn_details)
-            
+            executor = await self._get_sql_executor(state["agent_id"])
+
             clean_sql = state["generated_sql"].strip().rstrip(";")
             logger.info("Executing SQL", sql_preview=clean_sql[:100])
             results = await executor.execute(clean_sql)
             
-            # Update query history with success
+            # Update query history with success (queued for batched background
+            # writing; the result shouldn't wait on telemetry)
             if state.get("query_history_id"):
-                 await self.audit_logger.update_query_log(
+                 self.audit_logger.update_query_log_nowait(
                      query_history_id=state["query_history_id"],
                      generated_sql=state["generated_sql"],
                      row_count=len(results),
@@ -36,8 +100,15 @@ class ExecutorNodes(BaseNode):
             }
         except Exception as e:
             logger.error("Execution failed", error=str(e))
+            if "DATABASE_CONNECTION_ERROR" in str(e):
+                # Stale pool (rotated credentials, moved host): drop it so the
+                # next query rebuilds from fresh connection details
+                await invalidate_sql_executor(state["agent_id"])
+            # A plan that fails at execution time must not be served again
+            from agent.nodes.builder import evict_query_plan
+            evict_query_plan(state.get("plan_cache_key"))
             if state.get("query_history_id"):
-                 await self.audit_logger.update_query_log(
+                 self.audit_logger.update_query_log_nowait(
                      query_history_id=state["query_history_id"],
                      is_success=False,
                      error_message=str(e)
@@ -1,30 +1,117 @@
 import asyncio
+import hashlib
 import json
+import logging
+import re
+import time
+from itertools import islice
 from typing import Dict, Any, List, Optional, Tuple
 import structlog
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from agent.nodes.base import BaseNode, QueryState
-from agent.prompts import UNIFIED_INTENT_SYSTEM_PROMPT, GUARDRAIL_RESPONSE, DATA_GUIDE_SYSTEM_PROMPT
-from agent.utils import parse_json_content, format_chat_history
+from agent.prompts import (
+    UNIFIED_INTENT_SYSTEM_PROMPT,
+    UNIFIED_INTENT_TURN_CONTEXT,
+    GUARDRAIL_RESPONSE,
+    DATA_GUIDE_SYSTEM_PROMPT
+)
+from agent.prompts.builders import compile_prompt_template, render_prompt
+from agent.utils import parse_json_content
 from agent.llm import get_llm
 from agent.models import IntentStructure
+from services.llm_response_cache import LLMResponseCache
 
 logger = structlog.get_logger()
+# Stdlib twin used to gate verbose per-turn dumps (same pattern as base.py):
+# the event dicts are never built when DEBUG is filtered out.
+_stdlib_logger = logging.getLogger(__name__)
+
+# Rendered schema summaries keyed by schema content hash (plus the inputs that
+# shape them). Module-level so chatty sessions reuse them across turns and
+# agents, and they survive pipeline rebuilds; cleared wholesale when full.
+_SUMMARY_CACHE_MAX_SIZE = 64
+_orchestrator_summary_cache: Dict[Tuple, str] = {}
+_data_guide_context_cache: Dict[Tuple, str] = {}
+
+# Precompiled once: str.format would re-parse these multi-KB templates per turn
+_INTENT_STATIC_SEGMENTS = compile_prompt_template(UNIFIED_INTENT_SYSTEM_PROMPT)
+_INTENT_TURN_SEGMENTS = compile_prompt_template(UNIFIED_INTENT_TURN_CONTEXT)
+_DATA_GUIDE_SEGMENTS = compile_prompt_template(DATA_GUIDE_SYSTEM_PROMPT)
+
+# Serialized custom dictionary per agent; the dict is agent-static so its JSON
+# form shouldn't be re-encoded on every turn. The stored object id detects a
+# reloaded config.
+_custom_dict_json_cache: Dict[str, Tuple[int, str]] = {}
+
+def _custom_dict_json(agent_id: str, custom_dict: Any) -> str:
+    cached = _custom_dict_json_cache.get(agent_id)
+    if cached is not None and cached[0] == id(custom_dict):
+        return cached[1]
+    dumped = json.dumps(custom_dict, indent=2)
+    if len(_custom_dict_json_cache) >= _SUMMARY_CACHE_MAX_SIZE:
+        _custom_dict_json_cache.clear()
+    _custom_dict_json_cache[agent_id] = (id(custom_dict), dumped)
+    return dumped
+
+# Local security gate for raw-SQL messages: delegating non-SELECT rejection
+# to the LLM is both slow and less reliable than a real parser. Messages that
+# start with a SQL keyword are parsed with sqlglot; mutations are rejected
+# with a canned response before any LLM round-trip. Parse failures defer to
+# the orchestrator, which keeps its own SQL security rules.
+_SQL_MESSAGE_RE = re.compile(
+    r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|TRUNCATE|GRANT|REVOKE|EXEC(?:UTE)?)\b",
+    re.IGNORECASE
+)
+
+# Direct responses for conversational intents (greeting / data_guide /
+# out_of_scope) depend only on the rendered system prompt (agent name, schema
+# summary, restrictions, dictionary) and the message — not on chat history or
+# the current date — so the whole intent result can be replayed for a day
+# without an LLM round-trip. query_explanation is deliberately excluded: it
+# depends on the previous query. Exact-match tier only (no embeddings stored).
+_DIRECT_RESPONSE_INTENTS = frozenset({"greeting", "data_guide", "out_of_scope"})
+_direct_response_cache = LLMResponseCache(maxsize=512, ttl_seconds=24 * 3600)
+
+_AGENT_CONFIG_TTL_SECONDS = 60.0
+_AGENT_CONFIG_CACHE_MAX_SIZE = 128
+# (monotonic deadline, (config, schema, sensitivity)) per agent. The backing
+# stores are already Redis-cached; this layer skips the three network hops and
+# JSON decodes per turn, and — by handing back the SAME dict objects across
+# turns — lets the id()-keyed schema/rules memos in BaseNode hit between turns.
+_agent_config_cache: Dict[str, Tuple[float, Tuple[Dict, Dict, Dict]]] = {}
+
+
+def invalidate_agent_config(agent_id: str):
+    """Drop the in-process config snapshot (call when an agent is reconfigured)."""
+    _agent_config_cache.pop(agent_id, None)
+
 
 class IntentNodes(BaseNode):
+    __slots__ = ()
+
     async def load_config(self, state: QueryState) -> Dict:
         """Optimized config loader using parallel DB calls"""
         try:
             logger.info("=== LOADING AGENT CONFIGURATION (Optimized) ===", agent_id=state["agent_id"])
 
-            # 1. Parallelize DB calls
-            config_task = self.system_db.get_agent_config(state["agent_id"])
-            schema_task = self.system_db.get_agent_enriched_metadata(state["agent_id"])
-            sensitivity_task = self.system_db.get_agent_sensitivity(state["agent_id"])
+            cached = _agent_config_cache.get(state["agent_id"])
+            if cached is not None and time.monotonic() < cached[0]:
+                config, schema, sensitivity = cached[1]
+            else:
+                # 1. Parallelize DB calls
+                config_task = self.system_db.get_agent_config(state["agent_id"])
+                schema_task = self.system_db.get_agent_enriched_metadata(state["agent_id"])
+                sensitivity_task = self.system_db.get_agent_sensitivity(state["agent_id"])
+
+                config, schema, sensitivity = await asyncio.gather(config_task, schema_task, sensitivity_task)
+                if len(_agent_config_cache) >= _AGENT_CONFIG_CACHE_MAX_SIZE:
+                    _agent_config_cache.clear()
+                _agent_config_cache[state["agent_id"]] = (
+                    time.monotonic() + _AGENT_CONFIG_TTL_SECONDS,
+                    (config, schema, sensitivity)
+                )
 
-            config, schema, sensitivity = await asyncio.gather(config_task, schema_task, sensitivity_task)
-            
             # Initialize LLM
             self.llm = get_llm(
                 provider=config.get('llmProvider', 'openai'),
@@ -51,6 +138,30 @@ class IntentNodes(BaseNode):
         """Consolidated refinement and NLU detection in a single LLM call"""
         if state.get("error"): return {}
 
+        # Deterministic direct-SQL gate: mutations are rejected locally with a
+        # canned response, without paying for the orchestrator call
+        detected_operation = self._detect_sql_mutation(state["user_message"])
+        if detected_operation:
+            logger.info("Direct SQL mutation rejected locally", operation=detected_operation)
+            return {
+                "intent": {
+                    "primary_intent": "database_query",
+                    "is_direct_sql": True,
+                    "is_readonly_sql": False,
+                    "rejected": True,
+                    "rejection_reason": f"Only read-only SELECT queries are permitted. {detected_operation} operations are blocked for security.",
+                    "detected_operation": detected_operation,
+                    "route_to": "none",
+                    "intent_summary": "Direct SQL rejected by local security gate"
+                },
+                "is_refinement": False,
+                "is_direct_sql": True,
+                "is_off_topic": True,
+                "final_response": f"I can only help with reading data, not modifying it. {detected_operation} operations are not permitted. If you need to view data, please rephrase as a SELECT query.",
+                "data_fetched": False,
+                "current_step": "intent_analyzed"
+            }
+
         # Prepare context
         custom_dict = state["agent_config"].get("customDictionary", {})
         orchestrator_summary = self._build_orchestrator_schema_summary(state)
@@ -64,32 +175,54 @@ class IntentNodes(BaseNode):
         previous_user_message = state.get("previous_user_message", "N/A")
         previous_sql = state.get("previous_sql", "N/A")
         
-        logger.info("Orchestrator Context", 
-                    previous_sql=previous_sql[:100] if previous_sql else "None",
-                    previous_user_message=previous_user_message)
+        if _stdlib_logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Orchestrator Context",
+                         previous_sql=previous_sql[:100] if previous_sql else "None",
+                         previous_user_message=previous_user_message)
 
         from datetime import datetime
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        chat_history = format_chat_history(state.get("context", []))
-
-        system_prompt = UNIFIED_INTENT_SYSTEM_PROMPT.format(
-            agent_name=agent_name,
-            schema_summary=orchestrator_summary,
-            restricted_entities=restricted_entities,
-            custom_dict=json.dumps(custom_dict, indent=2),
-            chat_history=chat_history,
-            previous_user_message=previous_user_message,
-            previous_sql=previous_sql,
-            user_message=state["user_message"],
-            current_date=current_date
-        )
+        chat_history = self._format_chat_history(state.get("context", []))
+
+        # Stable, agent-invariant prefix first; per-turn inputs in a second
+        # message so provider prompt caching hits the prefix across turns.
+        system_prompt = render_prompt(_INTENT_STATIC_SEGMENTS, {
+            "agent_name": agent_name,
+            "schema_summary": orchestrator_summary,
+            "restricted_entities": restricted_entities,
+            "custom_dict": _custom_dict_json(state["agent_id"], custom_dict)
+        })
+        candidate_tables = await self._get_candidate_tables(state)
+        turn_context = render_prompt(_INTENT_TURN_SEGMENTS, {
+            "chat_history": chat_history,
+            "previous_user_message": previous_user_message,
+            "previous_sql": previous_sql,
+            "user_message": state["user_message"],
+            "current_date": current_date,
+            "candidate_tables": ", ".join(candidate_tables) if candidate_tables else "N/A"
+        })
 
         try:
+            # Replay cached conversational turns ("hi", "what can I ask") before
+            # paying for the orchestrator call. Only for deterministic configs;
+            # the key covers everything the static prompt encodes.
+            direct_key = None
+            if not self.agent_config.get('llmTemperature', 0.0):
+                normalized_message = " ".join(state["user_message"].lower().split())
+                direct_key = hashlib.sha256(
+                    f"{self.agent_config.get('llmModel')}|{system_prompt}|{normalized_message}".encode()
+                ).hexdigest()
+                cached_direct = _direct_response_cache.get(direct_key)
+                if cached_direct is not None:
+                    logger.info("Direct response cache hit", agent_id=state["agent_id"])
+                    return {**cached_direct["response"]}
+
             logger.info("Calling Orchestrator LLM", agent_id=state["agent_id"], model=self.agent_config.get("llmModel"))
-            
+
             response_obj = await self._call_llm_with_logging(
                 messages=[
-                    SystemMessage(content=system_prompt),
+                    self._static_system_message(system_prompt),
+                    SystemMessage(content=turn_context),
                     HumanMessage(content=state["user_message"])
                 ],
                 node_name="unified_intent",
@@ -107,9 +240,11 @@ class IntentNodes(BaseNode):
                     "current_step": "intent_analyzed"
                 }
 
-            # Map unified response to QueryState
+            # Map unified response to QueryState. Full-dict dump only at DEBUG;
+            # the summary fields are logged at INFO below.
             content = response_obj.model_dump()
-            logger.info("Parsed intent content", content=content)
+            if _stdlib_logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Parsed intent content", content=content)
             
             primary_intent = content.get("primary_intent")
             is_refinement = content.get("is_refinement", False)
@@ -172,6 +307,12 @@ class IntentNodes(BaseNode):
                 if primary_intent == "greeting" and not content.get("direct_response"):
                     result["final_response"] = "Hi there! How can I help you with your data today?"
 
+            if direct_key and not rejected and primary_intent in _DIRECT_RESPONSE_INTENTS \
+               and result.get("final_response"):
+                _direct_response_cache.put(
+                    direct_key, f"direct_response:{state['agent_id']}", result
+                )
+
             return result
         except Exception as e:
             logger.error("Unified intent node failed", error=str(e), traceback=True)
@@ -184,6 +325,56 @@ class IntentNodes(BaseNode):
             }
 
 
+    async def batch_classify_intents(self, state: QueryState, turns: List[str]) -> List[Any]:
+        """
+        Classify many user messages against one agent in a single batch — for
+        replaying transcripts, offline evals and prompt regression runs, where
+        calling unified_intent_node per turn re-sends the full prompt N times.
+
+        The static system prompt is rendered once and marked for provider-side
+        caching, so the first call pays the cache write and the remaining
+        turns read it; calls run concurrently under the shared LLM semaphore.
+        Each turn is classified independently (no chat history), which matches
+        the replay use case. Returns one IntentStructure per turn, in order;
+        failed calls come back as exception objects in their slot.
+        """
+        if not turns:
+            return []
+
+        custom_dict = state["agent_config"].get("customDictionary", {})
+        system_prompt = render_prompt(_INTENT_STATIC_SEGMENTS, {
+            "agent_name": state["agent_config"].get("name", "AI Assistant"),
+            "schema_summary": self._build_orchestrator_schema_summary(state),
+            "restricted_entities": self._build_restricted_context(state),
+            "custom_dict": _custom_dict_json(state["agent_id"], custom_dict)
+        })
+        static_message = self._static_system_message(system_prompt)
+
+        from datetime import datetime
+        current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        batches = []
+        for turn in turns:
+            turn_context = render_prompt(_INTENT_TURN_SEGMENTS, {
+                "chat_history": "No previous conversation.",
+                "previous_user_message": "N/A",
+                "previous_sql": "N/A",
+                "user_message": turn,
+                "current_date": current_date,
+                "candidate_tables": "N/A"
+            })
+            batches.append([
+                static_message,
+                SystemMessage(content=turn_context),
+                HumanMessage(content=turn)
+            ])
+
+        return await self._call_llm_with_logging_many(
+            batches,
+            node_name="unified_intent_batch",
+            query_history_id=state.get("query_history_id"),
+            structured_model=IntentStructure
+        )
+
     async def guardrail_responder(self, state: QueryState) -> Dict:
         """Standard guardrail responder - uses direct_response if provided by orchestrator"""
         response = state.get("final_response") or GUARDRAIL_RESPONSE
@@ -255,10 +446,10 @@ class IntentNodes(BaseNode):
         agent_config = state.get("agent_config", {})
         guide_context = self._build_data_guide_context(schema_metadata, agent_config)
 
-        system_prompt = DATA_GUIDE_SYSTEM_PROMPT.format(
-            guide_context=guide_context,
-            agent_name=agent_config.get("name", "Database Assistant")
-        )
+        system_prompt = render_prompt(_DATA_GUIDE_SEGMENTS, {
+            "guide_context": guide_context,
+            "agent_name": agent_config.get("name", "Database Assistant")
+        })
 
         response = await self._call_llm_with_logging(
             messages=[
@@ -270,6 +461,67 @@ class IntentNodes(BaseNode):
         )
         return response.content
 
+    async def _get_candidate_tables(self, state: QueryState) -> List[str]:
+        """
+        Top-K table names from the precomputed schema vector index for the
+        current message. Fed into the orchestrator's turn context so the model
+        validates a shortlist instead of discovering tables from scratch —
+        raising the rate of high-confidence shortcuts that bypass the
+        schema_search node. The message embedding is cached (schema_search
+        reuses it on the fallback path), so the cost is one vector query.
+        """
+        try:
+            embedding = await self.embedding_service.generate_single_embedding(state["user_message"])
+            if not embedding:
+                return []
+            raw_results = await self.system_db.search_similar_vectors(
+                state["agent_id"], embedding, limit=8
+            )
+            names = []
+            for r in raw_results:
+                if r.get("similarity", 0) < 0.5 or r.get("target_type") != "table":
+                    continue
+                metadata = r.get("metadata", {})
+                if isinstance(metadata, str):
+                    metadata = json.loads(metadata)
+                name = metadata.get("table_name")
+                if name:
+                    names.append(name)
+            return list(dict.fromkeys(names))
+        except Exception as e:
+            logger.debug("Candidate table lookup failed", error=str(e))
+            return []
+
+    def _detect_sql_mutation(self, user_message: str) -> Optional[str]:
+        """
+        Name of the mutating operation (INSERT, DROP, ...) when the message is
+        raw SQL containing one, else None. Only messages that start with a SQL
+        keyword are parsed; anything sqlglot can't parse defers to the LLM.
+        """
+        if not user_message or not _SQL_MESSAGE_RE.match(user_message):
+            return None
+        import sqlglot
+        from sqlglot import exp
+        mutation_types = tuple(
+            t for t in (
+                getattr(exp, name, None)
+                for name in ("Insert", "Update", "Delete", "Drop", "Create",
+                             "Alter", "TruncateTable", "Grant", "Revoke")
+            ) if t is not None
+        )
+        try:
+            statements = sqlglot.parse(user_message.strip().rstrip(";"))
+        except Exception:
+            return None
+        for stmt in statements:
+            if stmt is None:
+                continue
+            node = stmt if isinstance(stmt, mutation_types) else stmt.find(*mutation_types)
+            if node is not None:
+                name = type(node).__name__
+                return "TRUNCATE" if name == "TruncateTable" else name.upper()
+        return None
+
     def _build_orchestrator_schema_summary(self, state: QueryState) -> str:
         """
         Build a simplified schema summary specifically for the Orchestrator.
@@ -277,37 +529,44 @@ class IntentNodes(BaseNode):
         Section: How Entities Connect (Unique symmetrical relationships)
         Includes [RESTRICTED] labels for non-queryable tables and columns.
         """
-        lines = []
         schema_metadata = state["schema_metadata"]
+        forbidden_fields = (state.get("sensitivity_rules") or {}).get("forbiddenFields", [])
+
+        # Same string until the schema or rules change: memoize by content hash
+        cache_key = (self._schema_version(schema_metadata), tuple(sorted(forbidden_fields)))
+        cached = _orchestrator_summary_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        lines = []
         tables = schema_metadata.get("tables", [])
-        relationships = schema_metadata.get("relationships", [])
-        
-        # Build set of forbidden fields for efficient lookup
-        forbidden_fields = state.get("sensitivity_rules", {}).get("forbiddenFields", [])
-        forbidden_tables = {f.lower() for f in forbidden_fields if "." not in f}
-        forbidden_cols = {f.lower() for f in forbidden_fields if "." in f}
+
+        # Prebuilt forbidden-field sets (partitioned once per rules object)
+        forbidden_tables, forbidden_cols, _, _ = self._get_sensitivity_index(state.get("sensitivity_rules"))
 
         # 1. List all Tables
         lines.append("### AVAILABLE TABLES ###")
         for table in tables:
-            is_queryable = table.get("isQueryable", True)
             name = table.get("name") or table.get("tableName", "unknown")
+            name_lower = name.lower()
             desc = table.get("description")
-            
-            is_fully_restricted = not table.get("isQueryable", True) or name.lower() in forbidden_tables
-            
+
+            is_fully_restricted = not table.get("isQueryable", True) or name_lower in forbidden_tables
+
             label = ""
             if is_fully_restricted:
                 label = " [FULLY RESTRICTED]"
             else:
-                # Check for column-level restrictions
+                # Check for column-level restrictions (only build the qualified
+                # name when there are forbidden columns to check it against)
                 restricted_cols = []
                 for col in table.get("columns", []):
                     c_name = col.get("name") or col.get("columnName")
-                    full_col = f"{name.lower()}.{c_name.lower()}"
-                    if not col.get("isQueryable", True) or full_col in forbidden_cols:
+                    if not col.get("isQueryable", True) or (
+                        forbidden_cols and f"{name_lower}.{c_name.lower()}" in forbidden_cols
+                    ):
                         restricted_cols.append(c_name)
-                
+
                 if restricted_cols:
                     label = f" [COLUMNS RESTRICTED: {', '.join(restricted_cols)}]"
             
@@ -321,47 +580,56 @@ class IntentNodes(BaseNode):
         
         lines.append("")
 
-        # 2. List all Relationships (Symmetrical De-duplication)
-        if relationships:
+        # 2. List all Relationships (symmetrical dedup precomputed per schema)
+        unique_rels = self._get_unique_relationships(schema_metadata)
+        if unique_rels:
             lines.append("### HOW ENTITIES CONNECT ###")
-            seen_pairs = set()
-            for rel in relationships:
-                src = rel.get("sourceTable")
-                tgt = rel.get("targetTable")
-                if src and tgt:
-                    # Sort pair to treat (A, B) and (B, A) as identical
-                    pair = tuple(sorted([src, tgt]))
-                    if pair not in seen_pairs:
-                        lines.append(f"{src} connects to {tgt}")
-                        seen_pairs.add(pair)
-        
-        return "\n".join(lines)
+            for src, tgt in unique_rels:
+                lines.append(f"{src} connects to {tgt}")
+
+        summary = "\n".join(lines)
+        if len(_orchestrator_summary_cache) >= _SUMMARY_CACHE_MAX_SIZE:
+            _orchestrator_summary_cache.clear()
+        _orchestrator_summary_cache[cache_key] = summary
+        return summary
 
     def _build_data_guide_context(self, schema_metadata: Dict, agent_config: Dict) -> str:
         """Convert technical schema into natural language context."""
+        custom_dict = agent_config.get("customDictionary", {})
+        cache_key = (
+            self._schema_version(schema_metadata),
+            json.dumps(custom_dict, sort_keys=True, default=str)
+        )
+        cached = _data_guide_context_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         lines = []
         tables = schema_metadata.get("tables", [])
-        relationships = schema_metadata.get("relationships", [])
-        custom_dict = agent_config.get("customDictionary", {})
+        unique_rels = self._get_unique_relationships(schema_metadata)
 
         lines.append("=== Available Data Entities ===\n")
-        for table in [t for t in tables if t.get("isQueryable", True)][:15]:
+        # islice the filter generators: only the first 15 tables (and first 5
+        # key fields each) are rendered, so don't walk the rest of the schema
+        for table in islice((t for t in tables if t.get("isQueryable", True)), 15):
             t_name = table.get("name", "")
             desc = table.get("description", "")
             lines.append(f"**{t_name}**" + (f": {desc}" if desc else ""))
-            
-            cols = [f"  - {c['name']}" + (f": {c['description']}" if c.get('description') else "") 
-                    for c in table.get("columns", []) 
-                    if c.get("isQueryable", True) and c['name'].lower() not in ['id', 'created_at', 'updated_at']]
+
+            cols = list(islice(
+                (f"  - {c['name']}" + (f": {c['description']}" if c.get('description') else "")
+                 for c in table.get("columns", [])
+                 if c.get("isQueryable", True) and c['name'].lower() not in ('id', 'created_at', 'updated_at')),
+                5))
             if cols:
                 lines.append("  Key fields:")
-                lines.extend(cols[:5])
+                lines.extend(cols)
             lines.append("")
 
-        if relationships:
+        if unique_rels:
             lines.append("\n=== How Entities Connect ===\n")
-            for rel in relationships[:10]:
-                lines.append(f"- {rel.get('sourceTable')} connects to {rel.get('targetTable')}")
+            for src, tgt in unique_rels[:10]:
+                lines.append(f"- {src} connects to {tgt}")
 
         if custom_dict:
             lines.append("\n=== Special Terms ===\n")
@@ -369,4 +637,8 @@ class IntentNodes(BaseNode):
                 for term, definition in list(custom_dict.items())[:10]:
                     lines.append(f"- **{term}**: {definition}")
 
-        return "\n".join(lines)
+        context = "\n".join(lines)
+        if len(_data_guide_context_cache) >= _SUMMARY_CACHE_MAX_SIZE:
+            _data_guide_context_cache.clear()
+        _data_guide_context_cache[cache_key] = context
+        return context
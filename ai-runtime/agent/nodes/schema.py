@@ -1,26 +1,104 @@
-import re
 import difflib
+import hashlib
+import heapq
 import json
+import math
+from itertools import islice
+from operator import itemgetter
 from typing import Dict, Any, List, Optional
 import structlog
 
-from agent.nodes.base import BaseNode, QueryState
+from services.llm_response_cache import LLMResponseCache
+
+# rapidfuzz is optional: its native ratio is an order of magnitude faster than
+# difflib's pure-Python SequenceMatcher; fall back to difflib if not installed
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    fuzz = None
+    process = None
+    RAPIDFUZZ_AVAILABLE = False
+
+from agent.nodes.base import BaseNode, QueryState, _WORD_RE
 
 logger = structlog.get_logger()
 
+_FUZZY_THRESHOLD = 85.0
+
+# Whole-result semantic cache: a repeated or paraphrased question (cosine
+# >= 0.95 against a prior query embedding, same agent + schema version) skips
+# vector search, keyword scoring, the fuzzy loop and FK expansion entirely.
+# Reuses the two-tier exact/similarity cache from the LLM layer.
+_schema_search_cache = LLMResponseCache(maxsize=512, ttl_seconds=600, similarity_threshold=0.95)
+
+
+def _combine_embeddings(weighted: List[tuple]) -> List[float]:
+    """L2-normalized weighted sum of same-dimension (weight, vector) pairs."""
+    combined = [0.0] * len(weighted[0][1])
+    for weight, vec in weighted:
+        for i, v in enumerate(vec):
+            combined[i] += weight * v
+    norm = math.sqrt(sum(v * v for v in combined))
+    return [v / norm for v in combined] if norm > 0 else combined
+
+
+def _fuzzy_match(a: str, b: str) -> bool:
+    """True when the two strings are ~85% similar (both inputs pre-lowercased)."""
+    if a == b:
+        return True
+    # SequenceMatcher ratio is bounded by 2*min(la, lb)/(la + lb) — matched
+    # characters can never exceed the shorter string — so prune only when
+    # that bound falls below the threshold. (A tighter-looking prune on the
+    # raw length difference wrongly rejects e.g. "user"/"users" at 0.889.)
+    la, lb = len(a), len(b)
+    if 2 * (la if la < lb else lb) / (la + lb) < 0.85:
+        return False
+    if RAPIDFUZZ_AVAILABLE:
+        # score_cutoff returns 0 for anything below the threshold
+        return fuzz.ratio(a, b, score_cutoff=_FUZZY_THRESHOLD) > 0
+    return difflib.SequenceMatcher(None, a, b).ratio() > 0.85
+
 class SchemaNodes(BaseNode):
+    __slots__ = ()
+
     async def schema_search(self, state: QueryState) -> Dict:
         """Identify relevant tables from database schema with weighted scoring and expansion"""
         try:
             # Skip if we already have relevant schema (optimized for simple refinements)
-            # But proceed if intent explicitly identified relevant tables to ensure they are merged
+            # But proceed if intent identified tables that aren't already in it
+            intent_table_names = state.get("relevant_tables_from_intent") or []
             if state.get("relevant_schema") and state.get("is_refinement") and \
-               not state.get("needs_schema_search") and not state.get("relevant_tables_from_intent"):
-                return {
-                    "relevant_schema": state["relevant_schema"],
-                    "current_step": "schema_searched",
-                    "no_match": False
-                }
+               not state.get("needs_schema_search"):
+                prev_names = {t["name"].lower() for t in state["relevant_schema"]}
+                if all(n.lower() in prev_names for n in intent_table_names):
+                    return {
+                        "relevant_schema": state["relevant_schema"],
+                        "current_step": "schema_searched",
+                        "no_match": False
+                    }
+
+            # Fast path: every intent-pinned table resolves to an exact schema
+            # key, so the embedding call and vector round-trip (the dominant
+            # latency here) buy nothing — build the result from the index
+            if intent_table_names and not state.get("is_refinement"):
+                table_by_name, _ = self._get_relationship_index(state["schema_metadata"])
+                if all(n.lower() in table_by_name for n in intent_table_names):
+                    exact_tables = [table_by_name[n.lower()] for n in intent_table_names]
+                    exact_tables = self._expand_with_related_tables(
+                        exact_tables,
+                        state["schema_metadata"].get("tables", []),
+                        state["schema_metadata"]
+                    )
+                    logger.info(
+                        "Schema search short-circuited on exact intent tables",
+                        table_count=len(exact_tables)
+                    )
+                    return {
+                        "relevant_schema": exact_tables[:25],
+                        "no_match": False,
+                        "current_step": "schema_searched"
+                    }
 
             user_message = state["user_message"]
             search_query = user_message
@@ -31,79 +109,39 @@ class SchemaNodes(BaseNode):
 
             logger.info("Starting schema search", search_query=search_query)
 
-            # --- 1. Vector Search ---
-            query_embedding = await self.embedding_service.generate_single_embedding(search_query)
-            vector_results = []
-            if query_embedding:
-                raw_results = await self.system_db.search_similar_vectors(
-                    state["agent_id"], query_embedding, limit=20
-                )
-                vector_results = [r for r in raw_results if r.get("similarity", 0) >= 0.5 and r.get("target_type") == "table"]
-
-            # --- 2. Keyword/Fuzzy Hybrid Search ---
-            tokens = set(re.findall(r'\w+', user_message.lower()))
-            all_tables = state["schema_metadata"].get("tables", [])
-            table_by_name = {t["name"].lower(): t for t in all_tables}
-            keyword_matches = []
-            for t in all_tables:
-                t_name = t["name"].lower()
-                if t_name in tokens: 
-                    keyword_matches.append(t)
-                else:
-                    for token in tokens:
-                        if len(token) > 2 and difflib.SequenceMatcher(None, token, t_name).ratio() > 0.85:
-                            keyword_matches.append(t)
-                            break
-
-            # Match intent tables
-            intent_matches = []
-            intent_table_names = state.get("relevant_tables_from_intent", [])
-            for name in intent_table_names:
-                if name.lower() in table_by_name:
-                    intent_matches.append(table_by_name[name.lower()])
-                # Handle fuzzy/partial matches from intent
-                else:
-                    for t_name, t_obj in table_by_name.items():
-                        if difflib.SequenceMatcher(None, name.lower(), t_name).ratio() > 0.85:
-                            intent_matches.append(t_obj)
-                            break
+            query_embedding = await self._get_search_embedding(state, search_query)
 
-            # --- 3. Weighted Scoring ---
-            table_scores = {}
-            # Base results from vector search
-            for r in vector_results:
-                metadata = r.get("metadata", {})
-                if isinstance(metadata, str): metadata = json.loads(metadata)
-                t_name = metadata.get("table_name")
-                if t_name and t_name.lower() in table_by_name:
-                    table_scores[t_name] = table_scores.get(t_name, 0) + (r["similarity"] * 10.0)
-
-            # Boost keyword matches
-            for t in keyword_matches:
-                t_name = t["name"]
-                table_scores[t_name] = table_scores.get(t_name, 0) + 15.0
-
-            # Boost intent matches (Highest Priority)
-            for t in intent_matches:
-                t_name = t["name"]
-                table_scores[t_name] = table_scores.get(t_name, 0) + 25.0
-
-            # Sort and take top 10 candidates
-            sorted_candidates = sorted(table_scores.items(), key=lambda x: x[1], reverse=True)[:10]
-            final_relevant_tables = [table_by_name[name.lower()] for name, _ in sorted_candidates]
-
-            # --- 4. FK Relationship Expansion ---
-            if final_relevant_tables:
-                final_relevant_tables = self._expand_with_related_tables(
-                    final_relevant_tables, all_tables, state["schema_metadata"]
+            # --- 0. Semantic result cache (exact text, then cosine >= 0.95
+            # within the same agent + schema version) ---
+            cache_bucket = f"schema_search:{state['agent_id']}:{self._schema_version(state['schema_metadata'])}"
+            cache_key = hashlib.sha256(
+                f"{cache_bucket}|{search_query}|{sorted(intent_table_names)}".encode()
+            ).hexdigest()
+            entry = _schema_search_cache.get(cache_key)
+            # Similarity tier only when the intent didn't pin tables: a
+            # paraphrase hit can't account for explicitly requested tables
+            if entry is None and query_embedding and not intent_table_names:
+                entry = _schema_search_cache.get_similar(cache_bucket, query_embedding)
+            if entry is not None:
+                logger.info("Schema search cache hit", table_count=len(entry["response"]))
+                final_relevant_tables = list(entry["response"])
+            else:
+                final_relevant_tables = await self._search_candidate_tables(
+                    state, search_query, query_embedding
                 )
+                if final_relevant_tables:
+                    _schema_search_cache.put(
+                        cache_key, cache_bucket, final_relevant_tables, embedding=query_embedding
+                    )
 
             # --- 5. Refinement Merging ---
             if state.get("is_refinement") and state.get("relevant_schema"):
-                prev_tables = {t["name"].lower(): t for t in state["relevant_schema"]}
-                for t in final_relevant_tables:
-                    prev_tables[t["name"].lower()] = t
-                final_relevant_tables = list(prev_tables.values())[:25]
+                # Newly discovered tables go in first so they deterministically
+                # win the 25-slot cap; previous tables fill the remainder
+                merged = {t["name"].lower(): t for t in final_relevant_tables}
+                for t in state["relevant_schema"]:
+                    merged.setdefault(t["name"].lower(), t)
+                final_relevant_tables = list(islice(merged.values(), 25))
             else:
                 final_relevant_tables = final_relevant_tables[:25]
 
@@ -124,3 +162,122 @@ class SchemaNodes(BaseNode):
                 "current_step": "schema_searched",
                 "schema_search_failed": True
             }
+
+    async def _get_search_embedding(self, state: QueryState, search_query: str) -> List[float]:
+        """Embedding for the schema search query.
+
+        On refinement turns the history pieces are embedded as one batched
+        API call (the previous message is usually already in the embedding
+        cache from its own turn) and combined as a weighted sum, rather than
+        re-embedding the growing stitched string every turn.
+        """
+        if not (state.get("is_refinement") and state.get("previous_user_message")):
+            return await self.embedding_service.generate_single_embedding(search_query)
+
+        entities = [e for e in state.get("new_entities") or [] if e]
+        vectors = await self.embedding_service.generate_query_embeddings(
+            [state["user_message"], state["previous_user_message"], *entities]
+        )
+        current_vec, prev_vec = vectors[0], vectors[1]
+        if not current_vec or not prev_vec:
+            return await self.embedding_service.generate_single_embedding(search_query)
+
+        weighted = [(0.5, current_vec), (0.3, prev_vec)]
+        entity_vecs = [v for v in vectors[2:] if v]
+        if entity_vecs:
+            entity_weight = 0.2 / len(entity_vecs)
+            weighted.extend((entity_weight, v) for v in entity_vecs)
+        return _combine_embeddings(weighted)
+
+    async def _search_candidate_tables(
+        self, state: QueryState, search_query: str, query_embedding: List[float]
+    ) -> List[Dict[str, Any]]:
+        """Full hybrid search: vector + keyword/fuzzy + intent scoring + FK expansion."""
+        user_message = state["user_message"]
+
+        # --- 1. Vector Search ---
+        raw_results = []
+        if query_embedding:
+            raw_results = await self.system_db.search_similar_vectors(
+                state["agent_id"], query_embedding, limit=20
+            )
+
+        # --- 2. Keyword/Fuzzy Hybrid Search ---
+        # Precompiled pattern (shared with base) + single lowercasing pass;
+        # the lowercase-name map is memoized per schema object in the base node
+        tokens = set(_WORD_RE.findall(user_message.lower()))
+        all_tables = state["schema_metadata"].get("tables", [])
+        table_by_name, _ = self._get_relationship_index(state["schema_metadata"])
+        keyword_matches = []
+        for t_name, t in table_by_name.items():
+            if t_name in tokens:
+                keyword_matches.append(t)
+            else:
+                for token in tokens:
+                    if len(token) > 2 and _fuzzy_match(token, t_name):
+                        keyword_matches.append(t)
+                        break
+
+        # Match intent tables
+        intent_matches = []
+        intent_table_names = state.get("relevant_tables_from_intent", [])
+        if intent_table_names and RAPIDFUZZ_AVAILABLE:
+            # extractOne runs the whole candidate scan natively and exits
+            # early on an exact match (which scores 100), so no separate
+            # exact-key branch is needed
+            table_names_lower = list(table_by_name)
+            for name in intent_table_names:
+                hit = process.extractOne(
+                    name.lower(), table_names_lower,
+                    scorer=fuzz.ratio, score_cutoff=_FUZZY_THRESHOLD
+                )
+                if hit:
+                    intent_matches.append(table_by_name[hit[0]])
+        else:
+            for name in intent_table_names:
+                if name.lower() in table_by_name:
+                    intent_matches.append(table_by_name[name.lower()])
+                # Handle fuzzy/partial matches from intent
+                else:
+                    name_lower = name.lower()
+                    for t_name, t_obj in table_by_name.items():
+                        if _fuzzy_match(name_lower, t_name):
+                            intent_matches.append(t_obj)
+                            break
+
+        # --- 3. Weighted Scoring ---
+        table_scores = {}
+        # Base results from vector search: check the cheap fields first so
+        # metadata is only JSON-decoded for rows that survive the filter
+        for r in raw_results:
+            similarity = r.get("similarity", 0)
+            if similarity < 0.5 or r.get("target_type") != "table":
+                continue
+            metadata = r.get("metadata", {})
+            if isinstance(metadata, str): metadata = json.loads(metadata)
+            t_name = metadata.get("table_name")
+            if t_name and t_name.lower() in table_by_name:
+                table_scores[t_name] = table_scores.get(t_name, 0) + (similarity * 10.0)
+
+        # Boost keyword matches
+        for t in keyword_matches:
+            t_name = t["name"]
+            table_scores[t_name] = table_scores.get(t_name, 0) + 15.0
+
+        # Boost intent matches (Highest Priority)
+        for t in intent_matches:
+            t_name = t["name"]
+            table_scores[t_name] = table_scores.get(t_name, 0) + 25.0
+
+        # Top 10 candidates: heapq.nlargest is O(N log 10) in C vs a full sort,
+        # and itemgetter avoids a Python lambda per comparison
+        sorted_candidates = heapq.nlargest(10, table_scores.items(), key=itemgetter(1))
+        final_relevant_tables = [table_by_name[name.lower()] for name, _ in sorted_candidates]
+
+        # --- 4. FK Relationship Expansion ---
+        if final_relevant_tables:
+            final_relevant_tables = self._expand_with_related_tables(
+                final_relevant_tables, all_tables, state["schema_metadata"]
+            )
+
+        return final_relevant_tables
@@ -1,17 +1,27 @@
+import asyncio
 import copy
+import re
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import structlog
 from langchain_core.messages import SystemMessage, HumanMessage
-from mcp_tools.sql_executor import SQLExecutor
 
 from agent.nodes.base import BaseNode, QueryState
-from agent.prompts import build_sql_corrector_prompt
+from agent.nodes.executor import get_shared_sql_executor, invalidate_sql_executor
+from agent.prompts.builders import build_sql_corrector_segments, render_prompt
 from agent.models import SQLCorrection
 
 logger = structlog.get_logger()
 
+# Precompiled error classifiers: one scan of the message instead of repeated
+# substring probes on the correction hot path
+_MISSING_RE = re.compile(r'\b(Column|Table)\b(?=.*\bnot found\b)', re.DOTALL)
+_SCHEMA_NAME_RE = re.compile(r'\b(?:Column|Table)\b')
+
+
 class ValidatorNodes(BaseNode):
+    __slots__ = ()
+
     async def sql_validator_node(self, state: QueryState) -> Dict:
         """Validate generated SQL for safety, syntax and correctness"""
         if state.get("error") or not state.get("generated_sql"):
@@ -21,34 +31,32 @@ class ValidatorNodes(BaseNode):
         dialect = state["sql_dialect"]
         forbidden_fields = state.get("sensitivity_rules", {}).get("forbiddenFields", [])
 
-        # 1. Static & Syntax Validation (Security + SQLGlot)
-        result = self.sql_validator.validate(
-            sql, 
-            dialect=dialect,
-            forbidden_fields=forbidden_fields
+        # 1+2. Static/Syntax Validation (Security + SQLGlot) and Critical
+        # Semantic Linting (SQLFluff filtered) are independent CPU-bound
+        # passes: overlap them in the default thread pool
+        result, lint_errors = await asyncio.gather(
+            asyncio.to_thread(
+                self.sql_validator.validate, sql, dialect=dialect, forbidden_fields=forbidden_fields
+            ),
+            asyncio.to_thread(self.sql_validator.lint_sql, sql, dialect=dialect)
         )
 
-        # 2. Critical Semantic Linting (SQLFluff filtered)
-        lint_errors = self.sql_validator.lint_sql(sql, dialect=dialect)
-
         # 3. Dynamic Sandbox Validation (Execute with LIMIT 0)
         validation_error = None
         sandbox_success = True
-        
+
         if result["is_valid"]:
             try:
-                conn_details = await self.system_db.get_connection_details(state["agent_id"])
-                executor = SQLExecutor(conn_details)
-                
+                # Shared per-agent executor: no connection-details fetch or
+                # fresh pool per validation
+                executor = await get_shared_sql_executor(self.system_db, state["agent_id"])
+
                 # Strip trailing semicolon for subquery wrapping
                 clean_sql = sql.strip().rstrip(";")
                 sandbox_sql = clean_sql
-                if "limit" not in sql.lower():
-                    if dialect == "mysql":
-                        sandbox_sql = f"SELECT * FROM ({clean_sql}) AS sandbox_check LIMIT 0"
-                    else: # postgresql
-                        sandbox_sql = f"SELECT * FROM ({clean_sql}) AS sandbox_check LIMIT 0"
-                
+                if not self._has_limit_clause(sql):
+                    sandbox_sql = f"SELECT * FROM ({clean_sql}) AS sandbox_check LIMIT 0"
+
                 logger.info("Running sandbox validation", sql_preview=sandbox_sql[:50])
                 await executor.execute(sandbox_sql)
                 logger.info("Sandbox validation passed")
@@ -60,6 +68,9 @@ class ValidatorNodes(BaseNode):
                 is_conn_error = "DATABASE_CONNECTION_ERROR" in msg
                 
                 if is_conn_error:
+                    # Stale pool (rotated credentials, moved host): drop it so
+                    # the next query rebuilds from fresh connection details
+                    await invalidate_sql_executor(state["agent_id"])
                     # Clean up the message for user display
                     display_msg = msg.replace("DATABASE_CONNECTION_ERROR: ", "")
                     # Return immediately for connection errors
@@ -105,18 +116,20 @@ class ValidatorNodes(BaseNode):
             all_errors.extend(lint_errors[:10])
 
         # Combine into a single string for the prompt, ensuring uniqueness
-        unique_errors = []
-        seen_errors = set()
-        for err in all_errors:
-            if err not in seen_errors:
-                unique_errors.append(err)
-                seen_errors.add(err)
-        
+        # (dict.fromkeys dedupes in one pass, preserving order)
+        unique_errors = list(dict.fromkeys(all_errors))
+
         combined_error = "\n".join(unique_errors) if unique_errors else None
         
         # Consider the query valid only if there are NO errors and NO critical violations
         is_valid = result["is_valid"] and sandbox_success and not lint_errors
 
+        if not is_valid:
+            # Invalid SQL must not be re-served from the builder's plan cache
+            # (the corrector will rewrite it)
+            from agent.nodes.builder import evict_query_plan
+            evict_query_plan(state.get("plan_cache_key"))
+
         return {
             "validation_result": result,
             "validation_success": is_valid,
@@ -144,25 +157,23 @@ class ValidatorNodes(BaseNode):
             temp_state["pinned_schema"] = pinned_schema
             logger.info("SQL Corrector using pinned schema", tables=[t.get("name") for t in pinned_schema])
         
-        # Build strict schema context (uses pinned_schema if present)
+        # Build strict schema context (uses pinned_schema if present). Segment
+        # rendering never re-parses values, so no brace escaping is needed.
         schema_context = self._build_schema_context(temp_state)
-        schema_context_escaped = schema_context.replace("{", "{{").replace("}", "}}")
-        
+
         # Build restricted context only for involved tables
         pinned_table_names = [t.get("name") or t.get("tableName") for t in pinned_schema] if pinned_schema else None
         restricted_context = self._build_restricted_context(state, table_names_filter=pinned_table_names)
 
-        # Build dialect-specific SQL Corrector prompt
+        # Render the dialect-specific SQL Corrector prompt (precompiled segments)
         dialect = state.get("sql_dialect", "mysql")
-        system_prompt_template = build_sql_corrector_prompt(dialect)
-        
-        system_prompt = system_prompt_template.format(
-            current_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            schema_context=schema_context_escaped,
-            restricted_entities=restricted_context,
-            failed_sql=state.get("generated_sql", "No SQL generated"),
-            error_message=state.get("error", "Unknown error")
-        )
+        system_prompt = render_prompt(build_sql_corrector_segments(dialect), {
+            "current_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "schema_context": schema_context,
+            "restricted_entities": restricted_context,
+            "failed_sql": state.get("generated_sql", "No SQL generated"),
+            "error_message": state.get("error", "Unknown error")
+        })
 
         try:
             logger.info("Calling SQL Corrector LLM")
@@ -209,6 +220,70 @@ class ValidatorNodes(BaseNode):
         except Exception as e:
             logger.error("SQL correction failed", error=str(e))
             return {"error": str(e), "current_step": "error"}
+    def _has_limit_clause(self, sql: str) -> bool:
+        """
+        True when the statement already carries a LIMIT, checked on the cached
+        sqlglot AST. Replaces the substring probe over the lowercased SQL,
+        which false-matched identifiers or literals containing "limit".
+        """
+        from sqlglot import exp
+        try:
+            return self._parse_sql_ast(sql).find(exp.Limit) is not None
+        except Exception:
+            # Unparseable SQL: fall back to the conservative substring probe
+            return "limit" in sql.lower()
+
+    def _get_mapping_schema(self, relevant_schema: List[Dict], sensitivity_rules: Optional[Dict]):
+        """
+        sqlglot MappingSchema over the queryable, non-forbidden parts of the
+        relevant schema, memoized per (schema list, rules) object pair — the
+        corrector loop re-validates the same turn's schema several times.
+        """
+        from sqlglot.schema import MappingSchema
+
+        cache_key = (id(relevant_schema), id(sensitivity_rules))
+        cached = self._mapping_schema_cache.get(cache_key)
+        # Identity-checked: relevant_schema is rebuilt per turn while the node
+        # instance persists (per-agent pipeline cache), so a bare id() key can
+        # collide with a freed address. Holding both objects pins their ids.
+        if cached is not None and cached[0] is relevant_schema and cached[1] is sensitivity_rules:
+            return cached[2]
+
+        schema_dict = {}
+        forbidden_fields = (sensitivity_rules or {}).get("forbiddenFields", [])
+        forbidden_tables = {f.lower() for f in forbidden_fields if "." not in f}
+        forbidden_cols = {f.lower() for f in forbidden_fields if "." in f}
+
+        for table in relevant_schema:
+            t_name = table.get("name") or table.get("tableName")
+            if not t_name: continue
+            t_lower = t_name.lower()
+
+            # Skip non-queryable or forbidden tables
+            if not table.get("isQueryable", True) or t_lower in forbidden_tables:
+                continue
+
+            columns_map = {}
+            for col in table.get("columns", []):
+                c_name = col.get("name") or col.get("columnName")
+                if not c_name: continue
+                c_lower = c_name.lower()
+
+                # Skip non-queryable or forbidden columns
+                full_col = f"{t_lower}.{c_lower}"
+                if not col.get("isQueryable", True) or full_col in forbidden_cols:
+                    continue
+
+                c_type = col.get("type", "varchar").lower()
+                columns_map[c_name] = c_type
+
+            if columns_map:
+                schema_dict[t_name] = columns_map
+
+        schema = MappingSchema(schema_dict)
+        self._mapping_schema_cache = {cache_key: (relevant_schema, sensitivity_rules, schema)}  # Keep only latest pair
+        return schema
+
     async def native_schema_validator(self, state: QueryState) -> Dict:
         """Validate native SQL against database schema using SQLGlot catalog."""
         if state.get("error") or not state.get("generated_sql"):
@@ -221,50 +296,21 @@ class ValidatorNodes(BaseNode):
         errors = []
         
         # 1. SQLGlot Schema Validation
-        from sqlglot import parse_one, exp
+        from sqlglot import exp
         from sqlglot.optimizer.qualify_columns import qualify_columns
-        from sqlglot.schema import MappingSchema
         from sqlglot.errors import OptimizeError, ParseError
+        from mcp_tools.sql_validator import parse_sql_cached
 
         glot_dialect = "postgres" if dialect.lower() == "postgresql" else dialect.lower()
-        
+
         try:
-            # Build Schema from relevant_schema, respecting restrictions
-            schema_dict = {}
-            forbidden_fields = state.get("sensitivity_rules", {}).get("forbiddenFields", [])
-            forbidden_tables = {f.lower() for f in forbidden_fields if "." not in f}
-            forbidden_cols = {f.lower() for f in forbidden_fields if "." in f}
-            
-            for table in relevant_schema:
-                t_name = table.get("name") or table.get("tableName")
-                if not t_name: continue
-                t_lower = t_name.lower()
-                
-                # Skip non-queryable or forbidden tables
-                if not table.get("isQueryable", True) or t_lower in forbidden_tables:
-                    continue
-                
-                columns_map = {}
-                for col in table.get("columns", []):
-                    c_name = col.get("name") or col.get("columnName")
-                    if not c_name: continue
-                    c_lower = c_name.lower()
-                    
-                    # Skip non-queryable or forbidden columns
-                    full_col = f"{t_lower}.{c_lower}"
-                    if not col.get("isQueryable", True) or full_col in forbidden_cols:
-                        continue
-                        
-                    c_type = col.get("type", "varchar").lower()
-                    columns_map[c_name] = c_type
-                
-                if columns_map:
-                    schema_dict[t_name] = columns_map
-            
-            schema = MappingSchema(schema_dict)
-            
-            # Parse and Qualify
-            expression = parse_one(sql, read=glot_dialect)
+            # Schema built from relevant_schema, respecting restrictions;
+            # memoized so corrector iterations on the same turn reuse it
+            schema = self._get_mapping_schema(relevant_schema, state.get("sensitivity_rules"))
+
+            # Reuse the AST parsed by SQLValidator.validate(); qualify_columns
+            # rewrites the tree in place, so work on a copy
+            expression = parse_sql_cached(sql, glot_dialect).copy()
             qualify_columns(expression, schema=schema)
             logger.info("SQLGlot schema validation passed")
             
@@ -273,13 +319,14 @@ class ValidatorNodes(BaseNode):
         except OptimizeError as e:
             # OptimizeError is often where qualify_columns throws for missing items
             msg = str(e)
-            if "Column" in msg and "not found" in msg:
+            m = _MISSING_RE.search(msg)
+            if m is not None and m.group(1) == "Column":
                 msg = f"Schema Error: {msg}. Please check if the column name is correct and exists in the tables used."
-            elif "Table" in msg and "not found" in msg:
+            elif m is not None:
                 msg = f"Schema Error: {msg}. Please ensure you only use tables provided in the schema context."
             errors.append(msg)
         except Exception as e:
-            if "Column" in str(e) or "Table" in str(e):
+            if _SCHEMA_NAME_RE.search(str(e)):
                 errors.append(f"Schema Error: {str(e)}")
             else:
                 logger.warning("SQLGlot validation warning", error=str(e))
@@ -295,12 +342,7 @@ class ValidatorNodes(BaseNode):
                 if err not in errors:
                     errors.append(err)
 
-        unique_errors = []
-        seen = set()
-        for err in errors:
-            if err not in seen:
-                unique_errors.append(err)
-                seen.add(err)
+        unique_errors = list(dict.fromkeys(errors))
 
         combined_error = "\n".join(unique_errors) if unique_errors else None
         is_valid = not combined_error
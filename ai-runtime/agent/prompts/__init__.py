@@ -1,19 +1,23 @@
 from agent.prompts.orchestrator import (
     UNIFIED_INTENT_SYSTEM_PROMPT,
+    UNIFIED_INTENT_TURN_CONTEXT,
     GUARDRAIL_RESPONSE,
     DATA_GUIDE_SYSTEM_PROMPT
 )
 from agent.prompts.builders import (
     build_query_builder_prompt,
-    build_sql_corrector_prompt
+    build_sql_corrector_prompt,
+    QUERY_BUILDER_TURN_CONTEXT
 )
 from agent.prompts.response import RESPONSE_COMPOSER_SYSTEM_PROMPT
 
 __all__ = [
     "UNIFIED_INTENT_SYSTEM_PROMPT",
+    "UNIFIED_INTENT_TURN_CONTEXT",
     "GUARDRAIL_RESPONSE",
     "DATA_GUIDE_SYSTEM_PROMPT",
     "RESPONSE_COMPOSER_SYSTEM_PROMPT",
     "build_query_builder_prompt",
-    "build_sql_corrector_prompt"
+    "build_sql_corrector_prompt",
+    "QUERY_BUILDER_TURN_CONTEXT"
 ]
@@ -2,30 +2,114 @@
 Dynamic prompt builder functions.
 """
 
-from agent.prompts.common import COMMON_PROMPT_SECTIONS
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, Optional, Tuple
+
+from agent.prompts.common import (
+    COMMON_PROMPT_SECTIONS_MYSQL,
+    COMMON_PROMPT_SECTIONS_POSTGRESQL
+)
 from agent.prompts.mysql import (
     MYSQL_QUERY_BUILDER_PROMPT,
     MYSQL_REFINEMENT_PROMPT,
-    MYSQL_SQL_CORRECTOR_PROMPT,
-    MYSQL_DATE_TIME_SYNTAX,
-    MYSQL_STRING_FUNCTIONS,
-    MYSQL_BOOLEAN_SYNTAX,
-    MYSQL_GROUP_BY_RULES
+    MYSQL_SQL_CORRECTOR_PROMPT
 )
 from agent.prompts.postgres import (
     POSTGRESQL_QUERY_BUILDER_PROMPT,
     POSTGRESQL_REFINEMENT_PROMPT,
-    POSTGRESQL_SQL_CORRECTOR_PROMPT,
-    POSTGRESQL_DATE_TIME_SYNTAX,
-    POSTGRESQL_STRING_FUNCTIONS,
-    POSTGRESQL_BOOLEAN_SYNTAX,
-    POSTGRESQL_GROUP_BY_RULES
+    POSTGRESQL_SQL_CORRECTOR_PROMPT
 )
 
+def compile_prompt_template(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """
+    Pre-split a .format()-style template into (literal, field_name) segments.
+    str.format re-parses the whole multi-KB template on every call; rendering
+    the precompiled segments is a join over the pieces instead.
+    """
+    return tuple(
+        (literal, field)
+        for literal, field, _spec, _conv in Formatter().parse(template)
+    )
+
+
+def render_prompt(segments: Tuple[Tuple[str, Optional[str]], ...], values: Dict[str, Any]) -> str:
+    """Interpolate precompiled template segments with the given values."""
+    parts = []
+    append = parts.append
+    for literal, field in segments:
+        if literal:
+            append(literal)
+        if field is not None:
+            append(str(values[field]))
+    return "".join(parts)
+
+
+# The only interpolated fields in the Query Builder system prompt, appended
+# LAST so every byte before them — instructions, dialect rules, common
+# sections — is identical across turns and agents. Provider prefix caching
+# then survives a change in the selected schema, which previously sat at the
+# top and invalidated the whole prompt.
+QUERY_BUILDER_CONTEXT_SECTION = """
+---
+
+## SCHEMA CONTEXT
+{schema_context}
+
+## RESTRICTED ENTITIES
+{restricted_entities}
+"""
+
+# Likewise for the SQL Corrector: the per-failure fields trail the static
+# instruction prefix.
+SQL_CORRECTOR_CONTEXT_SECTION = """
+---
+
+## FAILURE CONTEXT
+- Current Date: {current_date}
+- Relevant Schema: {schema_context}
+- Restricted Entities:
+{restricted_entities}
+- Failed SQL:
+```sql
+{failed_sql}
+```
+- Error Message:
+```
+{error_message}
+```
+"""
+
+
+# Per-turn inputs for the Query Builder. Kept out of the main prompt so the
+# agent-invariant prefix (instructions, schema, dialect rules) stays
+# byte-identical across turns and provider-side prompt/prefix caching can hit.
+QUERY_BUILDER_TURN_CONTEXT = """## TURN CONTEXT
+- Current Date: {current_date}
+- Chat History: {chat_history}
+- Is Direct SQL: {is_direct_sql}
+
+**From Intent Analysis:**
+- Intent Summary: {intent_summary}
+- Is Refinement: {is_refinement}
+- Base Query to Modify:
+```sql
+{base_query_to_modify}
+```
+- Changes Requested: {changes}
+- Required Tables: {required_tables}
+- Extracted Timeframe: {extracted_timeframe}
+- Assumptions Made: {assumptions_made}
+"""
+
+
+@lru_cache(maxsize=None)
 def build_query_builder_prompt(dialect: str, is_refinement: bool = False, is_direct_sql: bool = False) -> str:
     """
     Build Query Builder prompt dynamically based on dialect and context.
-    
+    Memoized: the inputs span at most a handful of combinations, and each
+    build runs several .replace passes over multi-KB templates.
+
     Args:
         dialect: Database type ('mysql' or 'postgresql')
         is_refinement: Whether this is a refinement request
@@ -36,43 +120,34 @@ def build_query_builder_prompt(dialect: str, is_refinement: bool = False, is_dir
     """
     dialect_lower = dialect.lower() if dialect else "mysql"
     is_postgres = "postgres" in dialect_lower or dialect_lower == "postgresql"
-    
-    
-    # 1. Select Base Prompt and Syntax
+
+    # Dialect syntax blocks and the {{dialect}} name are resolved at import
+    # time in mysql.py/postgres.py/common.py, so only selection remains here
     if is_postgres:
-        syntax = {
-            "date_time_syntax": POSTGRESQL_DATE_TIME_SYNTAX,
-            "string_functions": POSTGRESQL_STRING_FUNCTIONS,
-            "boolean_syntax": POSTGRESQL_BOOLEAN_SYNTAX,
-            "group_by_rules": POSTGRESQL_GROUP_BY_RULES
-        }
         base_prompt = POSTGRESQL_REFINEMENT_PROMPT if is_refinement else POSTGRESQL_QUERY_BUILDER_PROMPT
+        common_sections = COMMON_PROMPT_SECTIONS_POSTGRESQL
     else:
-        syntax = {
-            "date_time_syntax": MYSQL_DATE_TIME_SYNTAX,
-            "string_functions": MYSQL_STRING_FUNCTIONS,
-            "boolean_syntax": MYSQL_BOOLEAN_SYNTAX,
-            "group_by_rules": MYSQL_GROUP_BY_RULES
-        }
         base_prompt = MYSQL_REFINEMENT_PROMPT if is_refinement else MYSQL_QUERY_BUILDER_PROMPT
+        common_sections = COMMON_PROMPT_SECTIONS_MYSQL
 
-    # 2. Format Syntax into Base Prompt (process placeholders if they exist)
-    for key, value in syntax.items():
-        placeholder = "{" + key + "}"
-        base_prompt = base_prompt.replace(placeholder, value)
-        
-    # 3. Inject Dialect Name into Common Sections
-    dialect_display_name = "PostgreSQL" if is_postgres else "MySQL"
-    common_sections = COMMON_PROMPT_SECTIONS.replace("{{dialect}}", dialect_display_name)
-    
-    # 5. Combine
-    return f"{base_prompt}\n{common_sections}"
+    return f"{base_prompt}\n{common_sections}\n{QUERY_BUILDER_CONTEXT_SECTION}"
+
+
+@lru_cache(maxsize=None)
+def build_query_builder_segments(dialect: str, is_refinement: bool = False, is_direct_sql: bool = False) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Precompiled segments of the Query Builder prompt, cached per variant."""
+    return compile_prompt_template(build_query_builder_prompt(dialect, is_refinement, is_direct_sql))
+
+
+QUERY_BUILDER_TURN_CONTEXT_SEGMENTS = compile_prompt_template(QUERY_BUILDER_TURN_CONTEXT)
 
 
+@lru_cache(maxsize=None)
 def build_sql_corrector_prompt(dialect: str) -> str:
     """
     Build SQL Corrector prompt based on database dialect.
-    
+    Memoized per dialect — the tight corrector loop rebuilds it otherwise.
+
     Args:
         dialect: Database type ('mysql' or 'postgresql')
         
@@ -81,13 +156,24 @@ def build_sql_corrector_prompt(dialect: str) -> str:
     """
     dialect_lower = dialect.lower() if dialect else "mysql"
     is_postgres = "postgres" in dialect_lower or dialect_lower == "postgresql"
-    
-    # 1. Select Base Prompt
-    base_prompt = POSTGRESQL_SQL_CORRECTOR_PROMPT if is_postgres else MYSQL_SQL_CORRECTOR_PROMPT
-    
-    # 2. Inject Dialect Name into Common Sections
-    dialect_display_name = "PostgreSQL" if is_postgres else "MySQL"
-    common_sections = COMMON_PROMPT_SECTIONS.replace("{{dialect}}", dialect_display_name)
-    
-    # 3. Combine
-    return f"{base_prompt}\n{common_sections}"
+
+    if is_postgres:
+        return f"{POSTGRESQL_SQL_CORRECTOR_PROMPT}\n{COMMON_PROMPT_SECTIONS_POSTGRESQL}\n{SQL_CORRECTOR_CONTEXT_SECTION}"
+    return f"{MYSQL_SQL_CORRECTOR_PROMPT}\n{COMMON_PROMPT_SECTIONS_MYSQL}\n{SQL_CORRECTOR_CONTEXT_SECTION}"
+
+
+@lru_cache(maxsize=None)
+def build_sql_corrector_segments(dialect: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Precompiled segments of the SQL Corrector prompt, cached per dialect.
+
+    Rendering segments never re-parses interpolated values, so the schema
+    context no longer needs brace escaping before insertion.
+    """
+    return compile_prompt_template(build_sql_corrector_prompt(dialect))
+
+
+# Warm the common variants so the first request doesn't pay the build either
+for _dialect in ("postgresql", "mysql"):
+    build_query_builder_prompt(_dialect)
+    build_sql_corrector_prompt(_dialect)
+del _dialect
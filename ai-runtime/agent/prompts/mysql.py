@@ -100,21 +100,11 @@ WHERE is_deleted = FALSE
 MYSQL_QUERY_BUILDER_PROMPT = """You are an expert MySQL engineer. Generate precise, optimized MySQL queries.
 
 ## INPUTS
-- Schema Context: {schema_context}
-- Restricted Entities: {restricted_entities}
 - SQL Dialect: MySQL
-- Current Date: {current_date}
-- Chat History: {chat_history}
-- Is Direct SQL: {is_direct_sql}
-
-**From Intent Analysis:**
-- Intent Summary: {intent_summary}
-- Is Refinement: {is_refinement}
-- Base Query to Modify: {base_query_to_modify}
-- Changes Requested: {changes}
-- Required Tables: {required_tables}
-- Extracted Timeframe: {extracted_timeframe}
-- Assumptions Made: {assumptions_made}
+- The schema context and restricted entities arrive in the CONTEXT section at
+  the END of this prompt.
+- Per-turn inputs (current date, chat history, intent analysis) arrive in the
+  TURN CONTEXT message that follows this one.
 
 ---
 
@@ -141,15 +131,9 @@ Generate a complete, executable SQL query in `generated_sql` that exactly matche
 
 MYSQL_REFINEMENT_PROMPT = """You are a MySQL SQL expert refining an existing query.
 
-## SCHEMA
-{schema_context}
-
-## RESTRICTED: {restricted_entities}
-
-## BASE QUERY TO MODIFY
-```sql
-{base_query_to_modify}
-```
+The schema and restricted entities arrive in the CONTEXT section at the END of
+this prompt; the base query to modify arrives in the TURN CONTEXT message that
+follows.
 
 ---
 
@@ -172,18 +156,9 @@ MYSQL_REFINEMENT_PROMPT = """You are a MySQL SQL expert refining an existing que
 MYSQL_SQL_CORRECTOR_PROMPT = """You are a specialized MySQL SQL Debugging Assistant.
 Your ONLY goal is to fix a MySQL query that failed during validation or execution.
 
-## CONTEXT PROVIDED:
 - **Dialect**: MySQL
-- **Current Date**: {current_date}
-- **Relevant Schema**: {schema_context}
-- **Restricted Entities:**
-{restricted_entities}
-- **Failed SQL**:
-```sql
-{failed_sql}
-```
-- **Error Message**:
-{error_message}
+- The relevant schema, restricted entities, failed SQL and error message arrive
+  in the FAILURE CONTEXT section at the END of this prompt.
 
 ---
 
@@ -195,3 +170,17 @@ Your ONLY goal is to fix a MySQL query that failed during validation or executio
 4. **Fix logical errors**: Ensure JOIN conditions use correct Foreign Keys.
 
 """
+
+# The dialect syntax blocks never vary per request, so substitute them once at
+# import; only true runtime fields ({schema_context}, ...) remain in the
+# templates the builders render.
+for _name, _block in (
+    ("date_time_syntax", MYSQL_DATE_TIME_SYNTAX),
+    ("string_functions", MYSQL_STRING_FUNCTIONS),
+    ("boolean_syntax", MYSQL_BOOLEAN_SYNTAX),
+    ("group_by_rules", MYSQL_GROUP_BY_RULES),
+):
+    _placeholder = "{" + _name + "}"
+    MYSQL_QUERY_BUILDER_PROMPT = MYSQL_QUERY_BUILDER_PROMPT.replace(_placeholder, _block)
+    MYSQL_REFINEMENT_PROMPT = MYSQL_REFINEMENT_PROMPT.replace(_placeholder, _block)
+del _name, _block, _placeholder
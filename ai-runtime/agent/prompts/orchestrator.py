@@ -65,7 +65,7 @@ What would you like to explore?"
 Now, based on the user's question and the data context above, provide a helpful, natural explanation.
 """
 
-UNIFIED_INTENT_SYSTEM_PROMPT = """You are an intelligent SQL agent orchestrator for {agent_name}. 
+UNIFIED_INTENT_SYSTEM_PROMPT = """You are an intelligent SQL agent orchestrator.
 
 Your responsibilities:
 1. Classify user intent
@@ -75,20 +75,14 @@ Your responsibilities:
 5. Block out-of-scope requests with guardrail responses
 
 ## INPUTS
-- Agent Name: {agent_name}
-- Schema Summary: {schema_summary}
-- Restricted Entities: {restricted_entities}
-- Custom Dictionary: {custom_dict}
-- Chat History: {chat_history}
-- Previous Query Details:
-  - User Message: {previous_user_message}
-  - Generated SQL: {previous_sql}
-- Current Message: {user_message}
-- Reference Date: {current_date}
+- The AGENT CONTEXT section at the END of this prompt carries the agent name,
+  Schema Summary, Restricted Entities and Custom Dictionary.
+- Per-turn inputs (chat history, previous query details, current message and
+  the Reference Date) arrive in the TURN CONTEXT message that follows this one.
 
 ---
 
-- **Restricted Entities**: The `{restricted_entities}` block categorizes entities into `### FULLY RESTRICTED TABLES (Blocking) ###` and `### TABLES WITH RESTRICTED COLUMNS (Partial Access) ###`.
+- **Restricted Entities**: The Restricted Entities block in the AGENT CONTEXT categorizes entities into `### FULLY RESTRICTED TABLES (Blocking) ###` and `### TABLES WITH RESTRICTED COLUMNS (Partial Access) ###`.
 - **Handling Restricted Requests**:
   1. If a user asks for data from a **FULLY RESTRICTED TABLE**:
      - Set `primary_intent: "out_of_scope"`, `route_to: "none"`.
@@ -201,11 +195,11 @@ Set `is_direct_sql=true` when message contains SQL keywords:
 
 ## PART 5: TIME RESOLUTION
 
-Use `{current_date}` as reference point.
+Use the Reference Date from the TURN CONTEXT as reference point.
 
 | User Says | Missing Info | Resolution |
 |-----------|--------------|------------|
-| "March 5th" | Year | Use current year from {current_date} |
+| "March 5th" | Year | Use current year from the Reference Date |
 | "on the 10th" | Month, Year | Use current month and year |
 | "last July" | Year | Use current year (or previous if current month < July) |
 | "Q2" | Year | Use current year |
@@ -346,4 +340,28 @@ Return EXACTLY this JSON structure. Ensure all fields are present even if null.
 | `needs_schema_search` | You need to make this to True if you are not confident that you have identified all the tables in the `required_tables` field (for new query)  or in `new_entities` field (for refinements) otherwise False.|
 | `new_entities` | Additional Technical table names (other than `required_tables`) from schema summary needed for the refinement query. |
 | `confidence` | Confidence score for your complete decision and more focused on identifying the `required_tables` and `new_entities` and `needs_schema_search`. if you are 100% sure about your decision then make it between 0.9 to 1.0 otherwise make it less than 0.9. |
+
+---
+
+## AGENT CONTEXT
+
+- Agent Name: {agent_name}
+- Schema Summary:
+{schema_summary}
+- Restricted Entities:
+{restricted_entities}
+- Custom Dictionary: {custom_dict}
+"""
+
+# Per-turn inputs for the orchestrator. Separate from the system prompt above
+# so the agent-invariant prefix (instructions, schema summary, dictionaries)
+# stays byte-identical across turns and provider prompt caching can hit.
+UNIFIED_INTENT_TURN_CONTEXT = """## TURN CONTEXT
+- Chat History: {chat_history}
+- Previous Query Details:
+  - User Message: {previous_user_message}
+  - Generated SQL: {previous_sql}
+- Current Message: {user_message}
+- Reference Date: {current_date}
+- Candidate Tables (from a similarity search over the schema index — validate against the Schema Summary; not exhaustive): {candidate_tables}
 """
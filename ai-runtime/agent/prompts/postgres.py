@@ -99,21 +99,11 @@ WHERE is_deleted = FALSE
 POSTGRESQL_QUERY_BUILDER_PROMPT = """You are an expert PostgreSQL engineer. Generate precise, optimized PostgreSQL queries.
 
 ## INPUTS
-- Schema Context: {schema_context}
-- Restricted Entities: {restricted_entities}
 - SQL Dialect: PostgreSQL
-- Current Date: {current_date}
-- Chat History: {chat_history}
-- Is Direct SQL: {is_direct_sql}
-
-**From Intent Analysis:**
-- Intent Summary: {intent_summary}
-- Is Refinement: {is_refinement}
-- Base Query to Modify: {base_query_to_modify}
-- Changes Requested: {changes}
-- Required Tables: {required_tables}
-- Extracted Timeframe: {extracted_timeframe}
-- Assumptions Made: {assumptions_made}
+- The schema context and restricted entities arrive in the CONTEXT section at
+  the END of this prompt.
+- Per-turn inputs (current date, chat history, intent analysis) arrive in the
+  TURN CONTEXT message that follows this one.
 
 ---
 
@@ -140,15 +130,9 @@ Generate a complete, executable SQL query in `generated_sql` that exactly matche
 
 POSTGRESQL_REFINEMENT_PROMPT = """You are a PostgreSQL SQL expert refining an existing query.
 
-## SCHEMA
-{schema_context}
-
-## RESTRICTED: {restricted_entities}
-
-## BASE QUERY TO MODIFY
-```sql
-{base_query_to_modify}
-```
+The schema and restricted entities arrive in the CONTEXT section at the END of
+this prompt; the base query to modify arrives in the TURN CONTEXT message that
+follows.
 
 ---
 
@@ -166,20 +150,9 @@ POSTGRESQL_REFINEMENT_PROMPT = """You are a PostgreSQL SQL expert refining an ex
 POSTGRESQL_SQL_CORRECTOR_PROMPT = """You are a specialized PostgreSQL SQL Debugging Assistant.
 Your ONLY goal is to fix a PostgreSQL query that failed during validation or execution.
 
-## CONTEXT PROVIDED:
 - **Dialect**: PostgreSQL
-- **Current Date**: {current_date}
-- **Relevant Schema**: {schema_context}
-**Restricted Entities:**
-{restricted_entities}
-- **Failed SQL**:
-```sql
-{failed_sql}
-```
-- **Error Message**:
-```
-{error_message}
-```
+- The relevant schema, restricted entities, failed SQL and error message arrive
+  in the FAILURE CONTEXT section at the END of this prompt.
 
 ---
 
@@ -211,3 +184,16 @@ Common PostgreSQL-specific fixes:
 - String concat: Use `||` or `CONCAT()`
 - Case-insensitive: Use `ILIKE` instead of `LIKE`
 """
+
+# The dialect syntax blocks never vary per request, so substitute them once at
+# import; only true runtime fields ({schema_context}, ...) remain in the
+# templates the builders render.
+for _name, _block in (
+    ("date_time_syntax", POSTGRESQL_DATE_TIME_SYNTAX),
+    ("string_functions", POSTGRESQL_STRING_FUNCTIONS),
+    ("boolean_syntax", POSTGRESQL_BOOLEAN_SYNTAX),
+    ("group_by_rules", POSTGRESQL_GROUP_BY_RULES),
+):
+    _placeholder = "{" + _name + "}"
+    POSTGRESQL_QUERY_BUILDER_PROMPT = POSTGRESQL_QUERY_BUILDER_PROMPT.replace(_placeholder, _block)
+del _name, _block, _placeholder
@@ -49,20 +49,19 @@ def format_chat_history(history: List[Dict[str, Any]]) -> str:
     """Format chat history for LLM context"""
     if not history:
         return "No previous context."
-        
-    formatted = []
-    for msg in history:
+
+    def _fmt(msg: Dict[str, Any]) -> str:
         role = msg.get("role", "unknown")
         content = msg.get("content", "")
-        
-        # If assistant message is empty (common for table results in this platform), 
+
+        # If assistant message is empty (common for table results in this platform),
         # try to show the SQL from metadata to give context
         if role == "assistant" and not content:
-            metadata = msg.get("metadata", {}) or {}
-            sql = metadata.get("sql")
+            sql = (msg.get("metadata") or {}).get("sql")
             if sql:
                 content = f"[Executed SQL Query: {sql}]"
-        
-        formatted.append(f"{role.upper()}: {content}")
-        
-    return "\n".join(formatted)
+
+        return f"{role.upper()}: {content}"
+
+    # Single join over a generator: no intermediate list for long histories
+    return "\n".join(_fmt(msg) for msg in history)
@@ -22,32 +22,42 @@ class ChartGeneratorService:
             
             with open(self.data_path, "r", encoding="utf-8") as f:
                 self.data = json.load(f)
-                
+
+            self._render_static_prompt()
             logger.info("ChartGeneratorService resources loaded successfully")
         except Exception as e:
             logger.error("Failed to load ChartGeneratorService resources", error=str(e))
             self.prompt_template = ""
             self.data = {}
+            self.static_prompt = ""
+
+    def _render_static_prompt(self):
+        """Pre-render the data-dependent placeholders once at load time.
+
+        The chart schemas / indicator / dimension lists are static per process,
+        so serializing them on every request only burned CPU; only the user
+        query placeholder is left for request time.
+        """
+        # Safely get data lists, defaulting to empty JSON array string if missing
+        all_chart_schemas = json.dumps(self.data.get("all_chart_schemas", []), indent=2)
+        indicator_list = json.dumps(self.data.get("indicator_list", []), indent=2)
+        dimension_list = json.dumps(self.data.get("dimension_list", []), indent=2)
+
+        self.static_prompt = self.prompt_template.replace(
+            "{{ALL_CHART_SCHEMAS_JSON}}", all_chart_schemas
+        ).replace(
+            "{{INDICATOR_LIST_JSON}}", indicator_list
+        ).replace(
+            "{{DIMENSION_LIST_JSON}}", dimension_list
+        )
 
     async def generate_config(self, user_query: str) -> Dict[str, Any]:
         """
         Generate chart configuration based on user query using the stored prompt and data.
         """
         try:
-            # 1. Prepare Prompt
-            # Safely get data lists, defaulting to empty JSON array string if missing
-            all_chart_schemas = json.dumps(self.data.get("all_chart_schemas", []), indent=2)
-            indicator_list = json.dumps(self.data.get("indicator_list", []), indent=2)
-            dimension_list = json.dumps(self.data.get("dimension_list", []), indent=2)
-
-            # Replace placeholders
-            system_prompt = self.prompt_template.replace(
-                "{{ALL_CHART_SCHEMAS_JSON}}", all_chart_schemas
-            ).replace(
-                "{{INDICATOR_LIST_JSON}}", indicator_list
-            ).replace(
-                "{{DIMENSION_LIST_JSON}}", dimension_list
-            ).replace(
+            # 1. Prepare Prompt (data lists are pre-rendered at load time)
+            system_prompt = self.static_prompt.replace(
                 "{{USER_NATURAL_LANGUAGE_QUERY}}", user_query
             )
 
@@ -11,6 +11,7 @@ from api.routes import router as api_router
 from api.chart_generator.routes import router as chart_router
 from api.websocket import sio
 from services.config import settings
+from services.audit_service import audit_service
 from services.cache_service import cache_service
 from services.state_checkpointer import state_checkpointer
 
@@ -49,6 +50,7 @@ async def lifespan(app: FastAPI):
     await state_checkpointer.initialize()
     yield
     # Cleanup
+    await audit_service.flush()
     await cache_service.close()
     await state_checkpointer.close()
     logger.info("Shutting down AI Runtime Backend")
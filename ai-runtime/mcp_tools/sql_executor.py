@@ -6,11 +6,78 @@ logger = structlog.get_logger()
 
 
 class SQLExecutor:
+    # Pool bounds per target database; queries are short-lived so a small pool
+    # covers typical per-agent concurrency.
+    POOL_MIN_SIZE = 1
+    POOL_MAX_SIZE = 5
+
     def __init__(self, connection_details: Dict[str, Any]):
         self.connection_details = connection_details
         self.db_type = connection_details.get("dbType", "postgresql")
         self._pool = None
-    
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self, timeout: int = 30):
+        """
+        Lazily create (once) and return the driver connection pool. Reusing
+        pooled connections removes the TCP/auth handshake from every query.
+        """
+        if self._pool is not None:
+            return self._pool
+        async with self._pool_lock:
+            if self._pool is None:
+                if self.db_type == "postgresql":
+                    import asyncpg
+                    logger.info(
+                        "Creating PostgreSQL pool",
+                        host=self.connection_details["host"],
+                        port=self.connection_details["port"],
+                        database=self.connection_details["database"],
+                        user=self.connection_details["username"]
+                    )
+                    self._pool = await asyncpg.create_pool(
+                        host=self.connection_details["host"],
+                        port=self.connection_details["port"],
+                        database=self.connection_details["database"],
+                        user=self.connection_details["username"],
+                        password=self.connection_details["password"],
+                        ssl=self.connection_details.get("sslEnabled", False),
+                        min_size=self.POOL_MIN_SIZE,
+                        max_size=self.POOL_MAX_SIZE,
+                        timeout=timeout
+                    )
+                else:
+                    import aiomysql
+                    logger.info(
+                        "Creating MySQL pool",
+                        host=self.connection_details["host"],
+                        port=self.connection_details["port"],
+                        database=self.connection_details["database"]
+                    )
+                    self._pool = await aiomysql.create_pool(
+                        host=self.connection_details["host"],
+                        port=self.connection_details["port"],
+                        db=self.connection_details["database"],
+                        user=self.connection_details["username"],
+                        password=self.connection_details["password"],
+                        minsize=self.POOL_MIN_SIZE,
+                        maxsize=self.POOL_MAX_SIZE,
+                        connect_timeout=timeout
+                    )
+        return self._pool
+
+    async def close(self):
+        """Close the underlying connection pool (invalidation/shutdown hook)."""
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        if self.db_type == "postgresql":
+            await pool.close()
+        else:
+            pool.close()
+            await pool.wait_closed()
+
+
     async def execute(
         self,
         sql: str,
@@ -50,53 +117,36 @@ class SQLExecutor:
         timeout: int,
         limit: int
     ) -> List[Dict[str, Any]]:
-        import asyncpg
-        
-        logger.info(
-            "Attempting PostgreSQL connection",
-            host=self.connection_details["host"],
-            port=self.connection_details["port"],
-            database=self.connection_details["database"],
-            user=self.connection_details["username"]
-        )
-        
-        # 1. CONNECT PHASE (Distinct error handling)
+        # 1. CONNECT PHASE (Distinct error handling) — acquire from the shared pool
         try:
-            conn = await asyncpg.connect(
-                host=self.connection_details["host"],
-                port=self.connection_details["port"],
-                database=self.connection_details["database"],
-                user=self.connection_details["username"],
-                password=self.connection_details["password"],
-                ssl=self.connection_details.get("sslEnabled", False),
-                timeout=timeout
-            )
+            pool = await self._get_pool(timeout)
+            conn = await pool.acquire()
         except Exception as e:
             # Explicitly prefix error to identify it as connection issue upstream
             logger.error("PostgreSQL connection failed", error=str(e), error_type=type(e).__name__)
             raise ConnectionError(f"DATABASE_CONNECTION_ERROR: {str(e)}") from e
-        
+
         # 2. EXECUTE PHASE
         try:
             rows = await asyncio.wait_for(
                 conn.fetch(sql),
                 timeout=timeout
             )
-            
+
             results = []
             for row in rows[:limit]:
                 results.append(dict(row))
-            
+
             logger.info(
                 "PostgreSQL query executed",
                 row_count=len(results),
                 sql_preview=sql[:100]
             )
-            
+
             return results
-            
+
         finally:
-            await conn.close()
+            await pool.release(conn)
     
     async def _execute_mysql(
         self,
@@ -105,21 +155,15 @@ class SQLExecutor:
         limit: int
     ) -> List[Dict[str, Any]]:
         import aiomysql
-        
-        # 1. CONNECT PHASE (Distinct error handling)
+
+        # 1. CONNECT PHASE (Distinct error handling) — acquire from the shared pool
         try:
-            conn = await aiomysql.connect(
-                host=self.connection_details["host"],
-                port=self.connection_details["port"],
-                db=self.connection_details["database"],
-                user=self.connection_details["username"],
-                password=self.connection_details["password"],
-                connect_timeout=timeout
-            )
+            pool = await self._get_pool(timeout)
+            conn = await pool.acquire()
         except Exception as e:
             logger.error("MySQL connection failed", error=str(e))
             raise ConnectionError(f"DATABASE_CONNECTION_ERROR: {str(e)}") from e
-        
+
         # 2. EXECUTE PHASE
         try:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
@@ -136,11 +180,11 @@ class SQLExecutor:
                 row_count=len(results),
                 sql_preview=sql[:100]
             )
-            
+
             return results
-            
+
         finally:
-            conn.close()
+            pool.release(conn)
     
     async def test_connection(self) -> Dict[str, Any]:
         try:
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 import structlog
 import sqlfluff
@@ -9,6 +10,17 @@ from sqlfluff.core import Linter, FluffConfig
 logger = structlog.get_logger()
 
 
+@lru_cache(maxsize=256)
+def parse_sql_cached(sql: str, glot_dialect: str):
+    """
+    Parse once per (sql, dialect) and share the AST between the syntax probe
+    in validate() and the schema validator's qualify pass — corrector
+    iterations re-validate the same statement several times. Callers that
+    mutate the tree must .copy() first.
+    """
+    return sqlglot.parse_one(sql, read=glot_dialect)
+
+
 class SQLValidator:
     CRITICAL_SQLFLUFF_RULE_PREFIXES = (
         "AM",   # Ambiguous references
@@ -86,10 +98,10 @@ class SQLValidator:
             result["errors"].append("SQL query is empty")
             return result
         
-        # 1. Hard syntax & parse validation (sqlglot)
+        # 1. Hard syntax & parse validation (sqlglot, cached per statement)
         glot_dialect = "postgres" if dialect.lower() == "postgresql" else dialect.lower()
         try:
-            sqlglot.parse_one(sql, read=glot_dialect, normalize=False)
+            parse_sql_cached(sql, glot_dialect)
         except ParseError as e:
             result["is_valid"] = False
             result["errors"].append(f"Syntax error: {str(e)}")
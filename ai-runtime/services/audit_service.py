@@ -3,6 +3,7 @@ Audit Service for Direct Database Writes
 Handles logging of query history, pipeline execution, and LLM calls
 """
 from typing import Dict, Any, List, Optional
+import asyncio
 import uuid
 from datetime import datetime
 import structlog
@@ -23,6 +24,134 @@ SENSITIVE_CONFIG_KEYS = {
 class AuditService:
     """Service for audit logging with direct database writes"""
 
+    # Query-log updates are coalesced: up to UPDATE_BATCH_SIZE pending updates
+    # share one session/commit instead of one DB round-trip each.
+    UPDATE_BATCH_SIZE = 64
+    UPDATE_FLUSH_INTERVAL = 1.0  # seconds to wait for more items before flushing
+
+    def __init__(self):
+        # Background queues so callers don't serialize the audit DB round-trip
+        # with user-visible latency; created lazily on the running loop.
+        self._llm_log_queue: Optional[asyncio.Queue] = None
+        self._llm_log_worker: Optional[asyncio.Task] = None
+        self._update_queue: Optional[asyncio.Queue] = None
+        self._update_worker: Optional[asyncio.Task] = None
+
+    def update_query_log_nowait(self, **kwargs) -> None:
+        """
+        Queue a query-log update for batched background writing. Drops the
+        entry with a warning if the queue is full.
+        """
+        try:
+            self._ensure_update_worker()
+            self._update_queue.put_nowait(kwargs)
+        except asyncio.QueueFull:
+            logger.warning(
+                "Audit queue full, dropping query log update",
+                query_history_id=str(kwargs.get("query_history_id"))
+            )
+
+    def _ensure_update_worker(self):
+        if self._update_queue is None:
+            self._update_queue = asyncio.Queue(maxsize=1000)
+        if self._update_worker is None or self._update_worker.done():
+            self._update_worker = asyncio.get_running_loop().create_task(self._drain_update_queue())
+
+    async def _drain_update_queue(self):
+        while True:
+            batch = [await self._update_queue.get()]
+            # Coalesce whatever arrives within the flush window, up to the batch cap
+            while len(batch) < self.UPDATE_BATCH_SIZE:
+                try:
+                    batch.append(await asyncio.wait_for(
+                        self._update_queue.get(), timeout=self.UPDATE_FLUSH_INTERVAL
+                    ))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._apply_query_log_updates(batch)
+            except Exception as e:
+                logger.warning("Batched audit update failed", error=str(e), batch_size=len(batch))
+            finally:
+                for _ in batch:
+                    self._update_queue.task_done()
+
+    async def _apply_query_log_updates(self, batch: List[Dict[str, Any]]):
+        """Apply a batch of query-log updates in one session/commit."""
+        ids = []
+        for item in batch:
+            item["query_history_id"] = await self._to_uuid(item.get("query_history_id"))
+            if item["query_history_id"] is not None:
+                ids.append(item["query_history_id"])
+        if not ids:
+            return
+
+        async for session in get_db():
+            stmt = select(QueryHistory).where(QueryHistory.id.in_(ids))
+            result = await session.execute(stmt)
+            logs_by_id = {log.id: log for log in result.scalars()}
+
+            for item in batch:
+                query_log = logs_by_id.get(item["query_history_id"])
+                if not query_log:
+                    logger.warning(
+                        "Query log not found for update",
+                        query_history_id=str(item["query_history_id"])
+                    )
+                    continue
+                if item.get("generated_sql") is not None:
+                    query_log.generatedSql = item["generated_sql"]
+                if item.get("execution_time_ms") is not None:
+                    query_log.executionTimeMs = item["execution_time_ms"]
+                if item.get("row_count") is not None:
+                    query_log.rowCount = item["row_count"]
+                if item.get("is_success") is not None:
+                    query_log.isSuccess = item["is_success"]
+                if item.get("error_message") is not None:
+                    query_log.errorMessage = item["error_message"]
+
+            await session.commit()
+            logger.debug("Query log updates applied", batch_size=len(batch))
+            return
+
+    def log_llm_call_nowait(self, **kwargs) -> None:
+        """
+        Queue an LLM call log for background writing instead of awaiting the
+        database round-trip on the request path. Drops the entry with a warning
+        if the queue is full.
+        """
+        try:
+            self._ensure_llm_log_worker()
+            self._llm_log_queue.put_nowait(kwargs)
+        except asyncio.QueueFull:
+            logger.warning(
+                "Audit queue full, dropping LLM call log",
+                node_name=kwargs.get("node_name")
+            )
+
+    def _ensure_llm_log_worker(self):
+        if self._llm_log_queue is None:
+            self._llm_log_queue = asyncio.Queue(maxsize=1024)
+        if self._llm_log_worker is None or self._llm_log_worker.done():
+            self._llm_log_worker = asyncio.get_running_loop().create_task(self._drain_llm_log_queue())
+
+    async def _drain_llm_log_queue(self):
+        while True:
+            kwargs = await self._llm_log_queue.get()
+            try:
+                await self.log_llm_call(**kwargs)
+            except Exception as e:
+                logger.warning("Background audit write failed", error=str(e))
+            finally:
+                self._llm_log_queue.task_done()
+
+    async def flush(self):
+        """Wait for queued audit writes to complete (shutdown hook)."""
+        if self._llm_log_queue is not None:
+            await self._llm_log_queue.join()
+        if self._update_queue is not None:
+            await self._update_queue.join()
+
     def _sanitize_llm_config(self, config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """
         Remove sensitive information from LLM configuration before logging.
@@ -17,6 +17,9 @@ class Settings(BaseSettings):
     openrouter_api_key: str = Field("", validation_alias="OPENROUTER_API_KEY")
     embedding_model: str = Field("text-embedding-3-small", validation_alias="EMBEDDING_MODEL")
     llm_model: str = Field("gpt-4-turbo-preview", validation_alias="LLM_MODEL")
+    # "compact" (default) or "verbose": which rendering of the shared prompt
+    # sections the builders use. Verbose is the pre-compression original.
+    prompt_style: str = Field("compact", validation_alias="PROMPT_STYLE")
     
     # Database URLs
     pgvector_url: str = Field(
@@ -1,4 +1,5 @@
-from typing import List
+import re
+from typing import Dict, List
 import openai
 import structlog
 
@@ -6,6 +7,15 @@ from services.config import settings
 
 logger = structlog.get_logger()
 
+# Single-query embeddings keyed by model + whitespace/case-normalized text.
+# Repeated or lightly rephrased searches skip the API round-trip (50-300ms);
+# module-level so every service instance shares one cache. Cleared
+# wholesale when full, like the other in-process caches.
+_QUERY_EMBEDDING_CACHE_MAX_SIZE = 512
+_query_embedding_cache: Dict[str, List[float]] = {}
+
+_WS_RE = re.compile(r'\s+')
+
 
 class EmbeddingService:
     def __init__(self):
@@ -47,6 +57,38 @@ class EmbeddingService:
             logger.error("Embedding generation failed", error=str(e))
             raise
     
+    async def generate_query_embeddings(self, texts: List[str], model: str = None) -> List[List[float]]:
+        """Cache-aware batch variant of generate_single_embedding.
+
+        Cache misses are embedded together in one API call and cached
+        individually, so e.g. a refinement turn only pays for the texts the
+        previous turn didn't already embed.
+        """
+        model_name = model or self.model
+        keys = [f"{model_name}|{_WS_RE.sub(' ', t.strip().lower())}" for t in texts]
+        results = [_query_embedding_cache.get(k) for k in keys]
+        miss_indices = [i for i, r in enumerate(results) if r is None]
+        if miss_indices:
+            fetched = await self.generate_embeddings([texts[i] for i in miss_indices], model)
+            for i, embedding in zip(miss_indices, fetched):
+                results[i] = embedding
+                if embedding:
+                    if len(_query_embedding_cache) >= _QUERY_EMBEDDING_CACHE_MAX_SIZE:
+                        _query_embedding_cache.clear()
+                    _query_embedding_cache[keys[i]] = embedding
+        return [r or [] for r in results]
+
     async def generate_single_embedding(self, text: str, model: str = None) -> List[float]:
+        # Model name in the key so a model swap invalidates automatically
+        cache_key = f"{model or self.model}|{_WS_RE.sub(' ', text.strip().lower())}"
+        cached = _query_embedding_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         embeddings = await self.generate_embeddings([text], model)
-        return embeddings[0] if embeddings else []
+        embedding = embeddings[0] if embeddings else []
+        if embedding:
+            if len(_query_embedding_cache) >= _QUERY_EMBEDDING_CACHE_MAX_SIZE:
+                _query_embedding_cache.clear()
+            _query_embedding_cache[cache_key] = embedding
+        return embedding
@@ -0,0 +1,162 @@
+"""
+LLM Response Cache Service
+
+Provides in-memory caching of LLM responses with TTL.
+Two tiers: exact-match lookup on a hash of the full request, plus an
+embedding-similarity lookup for near-identical classification prompts.
+Reduces provider round-trips (seconds) to in-process lookups (<10 ms).
+"""
+
+import time
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+
+class LLMResponseCache:
+    """
+    In-memory cache for deterministic (temperature 0) LLM calls.
+
+    Cache structure:
+    {
+        key: {
+            "key": <this entry's own key, so similarity hits can name it>,
+            "response": <parsed response object>,
+            "token_usage": {...},
+            "bucket": "agent_id:node_name:model:structured_model",
+            "embedding": [...] or None,
+            "timestamp": float
+        }
+    }
+
+    The bucket groups entries that are semantically comparable; similarity
+    lookups never cross buckets so an intent response can't answer a
+    query-builder prompt.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl_seconds: int = 3600, similarity_threshold: float = 0.97):
+        """
+        Args:
+            maxsize: Maximum cached entries before oldest entries are evicted
+            ttl_seconds: Time-to-live per entry (default: 1 hour)
+            similarity_threshold: Minimum cosine similarity for a tier-2 hit
+        """
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        logger.info("LLMResponseCache initialized", maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def make_key(node_name: str, provider: str, model: str, structured_model: str, message_contents: List[str]) -> str:
+        """Build the exact-match cache key from everything that shapes the response."""
+        payload = json.dumps(
+            [node_name, provider, model, structured_model, message_contents],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def make_bucket(agent_id: str, node_name: str, model: str, structured_model: str) -> str:
+        """Agent-scoped: similarity hits must never cross agents (schemas)."""
+        return f"{agent_id}:{node_name}:{model}:{structured_model}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Tier-1 exact lookup. Returns the cache entry or None."""
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry["timestamp"] > self.ttl_seconds:
+            del self.cache[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def get_similar(self, bucket: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Tier-2 lookup: cosine top-1 over same-bucket entries that carry an
+        embedding. Returns the entry if similarity clears the threshold.
+        """
+        if not embedding:
+            return None
+        now = time.time()
+        best_entry = None
+        best_sim = 0.0
+        for entry in self.cache.values():
+            if entry["bucket"] != bucket or not entry.get("embedding"):
+                continue
+            if now - entry["timestamp"] > self.ttl_seconds:
+                continue
+            sim = self._cosine(embedding, entry["embedding"])
+            if sim > best_sim:
+                best_sim = sim
+                best_entry = entry
+        if best_entry is not None and best_sim >= self.similarity_threshold:
+            self.similar_hits += 1
+            logger.info("LLM cache similarity hit", bucket=bucket, similarity=round(best_sim, 4))
+            return best_entry
+        return None
+
+    def put(
+        self,
+        key: str,
+        bucket: str,
+        response: Any,
+        token_usage: Optional[Dict[str, Any]] = None,
+        embedding: Optional[List[float]] = None
+    ):
+        """Store a response; evicts the oldest entries once maxsize is reached."""
+        if len(self.cache) >= self.maxsize:
+            # Evict the oldest ~10% in one pass instead of per-insert scans
+            oldest = sorted(self.cache.items(), key=lambda kv: kv[1]["timestamp"])
+            for k, _ in oldest[:max(1, self.maxsize // 10)]:
+                del self.cache[k]
+        self.cache[key] = {
+            "key": key,
+            "response": response,
+            "token_usage": token_usage or {},
+            "bucket": bucket,
+            "embedding": embedding,
+            "timestamp": time.time()
+        }
+
+    @staticmethod
+    def _cosine(a: List[float], b: List[float]) -> float:
+        if len(a) != len(b):
+            return 0.0
+        dot = 0.0
+        norm_a = 0.0
+        norm_b = 0.0
+        for x, y in zip(a, b):
+            dot += x * y
+            norm_a += x * x
+            norm_b += y * y
+        if norm_a == 0.0 or norm_b == 0.0:
+            return 0.0
+        return dot / ((norm_a ** 0.5) * (norm_b ** 0.5))
+
+    def clear_all(self):
+        """Clear entire cache"""
+        self.cache.clear()
+        logger.info("LLM response cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses
+        }
+
+
+# Global singleton instance
+llm_response_cache = LLMResponseCache(maxsize=2048, ttl_seconds=3600)